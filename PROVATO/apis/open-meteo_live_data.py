@@ -22,13 +22,7 @@ class OpenMeteo(WeatherData):
 
     def check_header(self, header):
         try:    
-            items = []
-
-            for item in self.config['weather_live_basic_data']:
-                items.append(item)
-
-            for item in self.config['weather_live_conditions_measurements']:
-                items.append(item)
+            items = list(self.config.columns)
 
             if not header == items:
                 return items
@@ -41,10 +35,10 @@ class OpenMeteo(WeatherData):
     
     def run(self, current, units):
         for item in current:
-            for name, all_alternative_names in self.config['weather_live_conditions_measurements'].items():
-                for alternative_name in all_alternative_names:
-                    if alternative_name == item:
-                        yield name, f'{current[item]}{units[item]}'
+            name = self.config.aliases.get(item)
+
+            if name is not None:
+                yield name, f'{current[item]}{units[item]}'
 
     def get_data(self, request):
         contents = json.loads(request.content.decode('utf-8'))
@@ -68,23 +62,21 @@ class OpenMeteo(WeatherData):
     def parse(self):
         self.init_get_stations(3)
 
-        for request, station in self.exporter_start_requests_api():
-            contents, data = self.get_data(request)
+        for request, station, url in self.exporter_start_requests_api():
+            result = self.get_data(request)
+
+            if result is None:
+                self.station_failed(station, 'no current weather')
+                continue
+
+            self.station_ok(station)
+            contents, data = result
 
-            self.set_farm(station.get('farm'))
-            self.set_source(station.get('source'))
-            self.set_timedata(contents['current']['time'])
-            self.set_city(station.get('city'))
-            self.set_nomos(station.get('nomos'))
-            self.set_station_number(station['station_number'])
+            measurements = self.get_measurements_api(data)
 
-            self.run_basic()
-            self.run_measurements_api_without_name(data)
+            measurements.update({'dew_point': None, 'heat_index': None, 'wind_chill': None, 'solar_radiation': None})
 
-            self.set_measurements({'dew_point': None})
-            self.set_measurements({'heat_index': None})
-            self.set_measurements({'wind_chill': None})
-            self.set_measurements({'solar_radiation': None})
+            record = self.build_record(station, contents['current']['time'], measurements)
 
             staging_path = self.config['preprocessing']['open-meteo']['staging']
             is_new = self.check_staging_csv(staging_path)
@@ -94,9 +86,10 @@ class OpenMeteo(WeatherData):
                     if is_new is True:
                         csv.writer(staging).writerow(self.check_header(None))
 
-                    csv.writer(staging).writerow(self.all_measurements.values())
+                    csv.writer(staging).writerow(record.values)
             except OSError as e:
                 print(e)
 
-test = OpenMeteo()
-test.parse()
\ No newline at end of file
+if __name__ == '__main__':
+    test = OpenMeteo()
+    test.parse()
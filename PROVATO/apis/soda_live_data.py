@@ -1,121 +1,185 @@
 from dotenv import load_dotenv
 load_dotenv() # load environment variables
 
-import csv
-import xml.etree.ElementTree as ET
+import csv, os
 from datetime import datetime, timedelta
 
+from apis.soda_reader import read_sensors
+from export.checkpoints import CheckpointStore
 from export.main import WeatherData
+from export.timestamps import ATHENS
 
 class Soda_Live_Data(WeatherData):
     def __init__(self):
         WeatherData.__init__(self)
 
-    def get_data(self, xml_data):
-        try:
-            root = ET.fromstring(xml_data)
+        # measurement -> SoDa sensor ids (the integer names in 'weather_live_conditions_measurements')
+        self._sensor_ids = {key: [] for key in self.config.measurements}
 
-            for weather_sensor_path in root.findall('.//unita'):
-                if int(weather_sensor_path.get('id')) in self.config['soda_api_paths']['weather_sensor_id_path']:
-                    return weather_sensor_path
-        except Exception as e:
-            print(e)
+        for sensor_id, key in self.config.sensor_ids.items():
+            self._sensor_ids[key].append(sensor_id)
 
-            return None
+        paths = self.config['soda_api_paths']
 
-    def find_record(self, measurement_label):
-        barometer_sensor = None
+        self._tolerance = int(paths['tolerance'])
+        self._window = timedelta(minutes = paths['window'])
+        self._catch_up = timedelta(hours = paths['catch_up'])
+        self._chunk = timedelta(minutes = paths['chunk'])
 
-        try:
-            for sensor in measurement_label.findall('sensore'):
-                barometer = self.config['weather_live_conditions_measurements']['barometer']
+        # newest barometer time already written per station (url), only newer data is requested and written
+        self._checkpoints = CheckpointStore(paths['checkpoints'])
+
+        self._chunks = {} # station -> urls of its chunks in date order, planned by 'build_api_urls'
+
+    def get_window(self, station):
+        # (start, end) of the data requested for the station:
+        # from the checkpoint (minus the tolerance, the other sensors of the first new record may be a bit older) to now,
+        # but never more than 'catch_up' hours back, and the last 'window' minutes for a station without checkpoint
+        end = self.crawled
+        checkpoint = self._checkpoints.get(station.url)
+
+        if checkpoint is None:
+            return end - self._window, end
+
+        start = datetime.fromtimestamp(checkpoint, ATHENS) - timedelta(seconds = self._tolerance)
+
+        return min(max(start, end - self._catch_up), end - timedelta(seconds = self._tolerance)), end
+
+    def build_api_urls(self, station):
+        # one request per 'chunk' minutes of the window, consecutive chunks overlap by the tolerance so no record loses its neighbours
+        url = station.url
 
-                for possible_names in barometer:
-                    if isinstance(possible_names, int) and (int(sensor.get('id')) == possible_names):
-                        barometer_sensor = sensor
-                        break
+        path = os.getenv(f'{url}_path')
+        username = os.getenv(f'{url}_username')
+        password = os.getenv(f'{url}_password')
+
+        start, end = self.get_window(station)
+        overlap = timedelta(seconds = self._tolerance)
+        urls = []
+
+        while True:
+            chunk_end = min(start + self._chunk, end)
+
+            start_date = start.strftime('%Y-%m-%d %H:%M:%S').replace(' ', '%20')
+            end_date = chunk_end.strftime('%Y-%m-%d %H:%M:%S').replace(' ', '%20')
+
+            urls.append(f'{path}?start_date={start_date}&end_date={end_date}&username={username}&password={password}')
+
+            if chunk_end >= end:
+                self._chunks[station] = urls
+
+                return urls
+
+            start = chunk_end - overlap
+
+    def get_data(self, xml_data):
+        # {sensor id: SensorSeries} of the weather units ('weather_sensor_id_path'), read in one streaming pass
+        try:
+            return read_sensors(xml_data, self.config['soda_api_paths']['weather_sensor_id_path'])
         except Exception as e:
             print(e)
 
             return None
 
-        if barometer_sensor is None:
-            return None
+    def find_sensor(self, sensors, key):
+        for sensor_id in self._sensor_ids[key]:
+            if sensor_id in sensors:
+                return sensors[sensor_id]
 
-        measurement = barometer_sensor.findall('misura')
+        return None
 
-        if measurement is None:
-            return None
+    def find_new_dates(self, sensors, checkpoint):
+        # the barometer times newer than the checkpoint, every one of them is a record
+        # a station without checkpoint only gets its newest record
+        barometer_sensor = self.find_sensor(sensors, 'barometer')
+
+        if barometer_sensor is None or barometer_sensor.latest() is None:
+            return []
 
-        measurement = measurement[-1]
-        measurement_date_string = measurement.get('data_ora')
-        measurement_date = datetime.strptime(measurement_date_string, '%Y-%m-%d %H:%M:%S')
-        tolerance = timedelta(minutes = 1, seconds = 30)
+        if checkpoint is None:
+            return [int(barometer_sensor.epochs[barometer_sensor.latest()])]
+
+        return [int(epoch) for epoch in barometer_sensor.epochs if epoch > checkpoint]
+
+    def find_record(self, sensors, measurement_date):
+        # ({measurement: value}, time) of the record of a barometer measurement, every other measurement is the one closest to it (within the tolerance)
+        measurements = {}
         time = None
-    
-        for key, possible_names in self.config['weather_live_conditions_measurements'].items():
-            found = False
-
-            for sensors in measurement_label.findall('sensore'):
-                id_sensor = int(sensors.get('id'))
-                unit = sensors.get('unita')
-
-                for possible_name in possible_names:
-                    if not (isinstance(possible_name, int) and id_sensor == possible_name):
-                        continue
-
-                    value = None
-                    min_time_difference = None
-
-                    for measurement in sensors.findall('misura'):
-                        date_hour_path = measurement.get('data_ora')
-                    
-                        try:
-                            dt = datetime.strptime(date_hour_path, '%Y-%m-%d %H:%M:%S')
-                            time_difference = abs(dt - measurement_date)
-                    
-                            if time_difference <= tolerance and (min_time_difference is None or time_difference < min_time_difference):
-                                value = f"{measurement.get('valore')}{unit}"
-                                time = date_hour_path
-                                min_time_difference = time_difference
-                                found = True
-                        except Exception as e:
-                            print(e)
-
-                    self.set_measurements({key: value})
-                    break
-
-            if found is False:
-                self.set_measurements({key: None})
-
-            self.all_measurements['timedata'] = time
 
-        return None
+        for key in self._sensor_ids:
+            sensor = self.find_sensor(sensors, key)
+            index = sensor.nearest(measurement_date, self._tolerance) if sensor is not None else None
+
+            if index is None:
+                measurements[key] = None
+                continue
+
+            measurements[key] = f"{sensor.values[index]}{sensor.unit}"
+            time = sensor.times[index]
+
+        return measurements, time
 
     def parse(self):
         self.init_get_stations(0)
+        self._chunks = {}
+
+        # the chunks of a station arrive in any order, they are processed in date order once all requests completed
+        responses = {}
+
+        for response, station, url in self.exporter_start_requests_api():
+            responses.setdefault(station, {})[url] = response
+
+        for station, urls in self._chunks.items():
+            self.parse_station(station, urls, responses.get(station, {}))
 
-        for request, station in self.exporter_start_requests_api():
-            self.set_farm(station.get('farm'))
-            self.set_source(station['source'])
-            self.set_city(station['city'])
-            self.set_nomos(station['nomos'])
-            self.set_station_number(station['station_number'])
+        self._checkpoints.save()
+        self.save_health()
 
-            self.run_basic()
+    def parse_station(self, station, urls, responses):
+        # the chunks are written in date order up to the first one that failed, and the checkpoint moves to the newest record written,
+        # so it never skips a window that was not fetched: the failed chunk and the ones after it are requested again next cycle
+        checkpoint = self._checkpoints.get(station.url)
+        written = set() # overlapping chunks contain the same records
+        rows = []
 
-            weather_sensors = self.get_data(request.content.decode('utf-8'))
+        for url in urls:
+            response = responses.get(url)
 
+            # a failed request, already reported by 'exporter_start_requests_api'
+            if response is None:
+                break
+
+            weather_sensors = self.get_data(response.content)
+
+            # a station whose response has no weather unit is skipped, the other stations are still written
             if weather_sensors is None:
-                return None
-            
-            self.find_record(weather_sensors)
-
-            try:
-                with open(self.config['preprocessing']['soda']['staging'], 'a', encoding = 'utf-8', newline = '') as staging:
-                    csv.writer(staging).writerow(self.all_measurements.values())
-            except FileNotFoundError as e:
-                print(e)
-
-test = Soda_Live_Data()
-test.parse()
\ No newline at end of file
+                if station not in self.failed_stations:
+                    self.station_failed(station, 'no weather unit')
+
+                break
+
+            for measurement_date in self.find_new_dates(weather_sensors, checkpoint):
+                if measurement_date in written:
+                    continue
+
+                measurements, time = self.find_record(weather_sensors, measurement_date)
+                rows.append(self.build_record(station, time, measurements).values)
+                written.add(measurement_date)
+        else:
+            self.station_ok(station)
+
+        if not rows:
+            return
+
+        try:
+            with open(self.config['preprocessing']['soda']['staging'], 'a', encoding = 'utf-8', newline = '') as staging:
+                csv.writer(staging).writerows(rows)
+        except FileNotFoundError as e:
+            print(e)
+            return
+
+        self._checkpoints.set(station.url, max(written))
+
+if __name__ == '__main__':
+    test = Soda_Live_Data()
+    test.parse()
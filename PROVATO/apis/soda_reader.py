@@ -0,0 +1,91 @@
+import io, numpy as np
+import xml.etree.ElementTree as ET
+
+from export.timestamps import to_epoch
+
+class SensorSeries:
+    # all the measurements ('misura') of one SoDa sensor ('sensore'), sorted by time
+    __slots__ = ('unit', 'epochs', 'values', 'times')
+
+    def __init__(self, unit, measurements):
+        measurements.sort(key = lambda measurement: measurement[0])
+
+        self.unit = unit
+        self.epochs = np.array([measurement[0] for measurement in measurements], dtype = np.int64)
+        self.values = [measurement[1] for measurement in measurements]
+        self.times = [measurement[2] for measurement in measurements]
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def latest(self):
+        # index of the newest measurement, None if the sensor has no measurements
+        return len(self.epochs) - 1 if len(self.epochs) > 0 else None
+
+    def nearest(self, epoch, tolerance):
+        # index of the measurement closest to 'epoch' (binary search), None if none is within 'tolerance' seconds
+        position = int(np.searchsorted(self.epochs, epoch))
+        best = None
+
+        for index in (position - 1, position):
+            if not 0 <= index < len(self.epochs):
+                continue
+
+            difference = abs(int(self.epochs[index]) - epoch)
+
+            if difference <= tolerance and (best is None or difference < abs(int(self.epochs[best]) - epoch)):
+                best = index
+
+        return best
+
+def read_sensors(content, unit_ids):
+    # reads a SoDa XML response in one streaming pass and returns {sensor id: SensorSeries}
+    # only the sensors of the units ('unita') in 'unit_ids' are kept, and every element is cleared as soon as it has been read,
+    # so memory stays flat even for responses covering several days
+    # returns None if none of the units is in the response
+    sensors = {}
+    found = False
+
+    in_unit = False
+    sensor_id = None
+    sensor_unit = None
+    measurements = []
+
+    for event, element in ET.iterparse(io.BytesIO(content), events = ('start', 'end')):
+        tag = element.tag
+
+        if event == 'start':
+            if tag == 'unita':
+                in_unit = int(element.get('id', -1)) in unit_ids
+                found = found or in_unit
+            elif tag == 'sensore' and in_unit:
+                sensor_id = int(element.get('id'))
+                sensor_unit = element.get('unita') or ''
+                measurements = []
+
+            continue
+
+        if tag == 'misura':
+            if in_unit and sensor_id is not None:
+                time = element.get('data_ora')
+
+                try:
+                    measurements.append((to_epoch(time), element.get('valore'), time))
+                except (ValueError, TypeError) as e:
+                    print(e)
+
+            element.clear()
+        elif tag == 'sensore':
+            if in_unit and sensor_id is not None and sensor_id not in sensors:
+                sensors[sensor_id] = SensorSeries(sensor_unit, measurements)
+
+            sensor_id = None
+            element.clear()
+        elif tag == 'unita':
+            in_unit = False
+            element.clear()
+
+    if found is False:
+        return None
+
+    return sensors
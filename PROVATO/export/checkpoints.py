@@ -0,0 +1,43 @@
+import os, json
+
+class CheckpointStore:
+    # persisted high-water marks: station url -> unix time of the newest measurement already collected
+    # the API collectors use it to only ask for data newer than what they already have
+    def __init__(self, path):
+        self._path = path
+        self._checkpoints = {}
+
+        self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, key):
+        return self._checkpoints.get(key)
+
+    def set(self, key, epoch):
+        # checkpoints only move forward
+        if self._checkpoints.get(key) is None or epoch > self._checkpoints[key]:
+            self._checkpoints[key] = int(epoch)
+
+    def load(self):
+        if not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding = 'utf-8') as checkpoints_file:
+                self._checkpoints = json.load(checkpoints_file)
+        except (OSError, ValueError) as e:
+            print(f"Checkpoints could not be loaded, starting without them: {e}")
+
+    def save(self):
+        directory = os.path.dirname(self._path)
+
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+
+        with open(f'{self._path}.tmp', 'w', encoding = 'utf-8') as checkpoints_file:
+            json.dump(self._checkpoints, checkpoints_file, indent = 2, sort_keys = True)
+
+        os.replace(f'{self._path}.tmp', self._path)
@@ -0,0 +1,152 @@
+import os, yaml, pickle
+
+# the config is loaded once per process into an immutable Config, with the lookup tables the collectors and the preprocessing need precomputed
+# the parsed yaml is also cached next to the config file ('<config>.cache', keyed on the modification time and size of the file),
+# so new processes (collectors, preprocessing workers) do not parse the yaml again
+
+REQUIRED_SECTIONS = ('weather_live_basic_data', 'weather_live_conditions_measurements', 'results_units', 'farms', 'weather_websites', 'preprocessing')
+REQUIRED_STATION_FIELDS = ('url', 'source', 'city', 'code')
+
+class FrozenDict(dict):
+    # a dict that can't be changed after it is built (the config is shared by everything in the process)
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("The config can't be changed")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+def freeze(value):
+    # dicts -> FrozenDict, lists -> tuples, recursively
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+
+    return value
+
+def validate(data):
+    # the problems are collected, so a broken config reports all of them at once
+    problems = []
+
+    for section in REQUIRED_SECTIONS:
+        if section not in data:
+            problems.append(f"missing section '{section}'")
+
+    aliases = {}
+
+    for measurement, alternative_names in (data.get('weather_live_conditions_measurements') or {}).items():
+        for alternative_name in alternative_names or []:
+            if alternative_name in aliases and aliases[alternative_name] != measurement:
+                problems.append(f"'{alternative_name}' is a name of both '{aliases[alternative_name]}' and '{measurement}'")
+
+            aliases[alternative_name] = measurement
+
+    for farm, stations in (data.get('farms') or {}).items():
+        for station in stations or []:
+            for field in REQUIRED_STATION_FIELDS:
+                if station.get(field) is None:
+                    problems.append(f"station '{station.get('url')}' of '{farm}' has no '{field}'")
+
+    if problems:
+        raise ValueError("Invalid config: " + "; ".join(problems))
+
+class Config(FrozenDict):
+    # the whole config, read like the parsed yaml (config['farms'] ...), plus:
+    # measurements: the measurement names, in the order of 'weather_live_conditions_measurements'
+    # columns: the columns of the staging and cleaned files ('weather_live_basic_data' + measurements)
+    # aliases: every alternative name of a measurement -> measurement ('temperature_2m' -> 'temperature')
+    # sensor_ids: every SoDa sensor id (the integer alternative names) -> measurement
+    # stations: station code ('soda', 'wu' ...) -> all its stations, each with the 'farm' it belongs to
+    def __init__(self, data):
+        validate(data)
+
+        FrozenDict.__init__(self, {key: freeze(value) for key, value in data.items()})
+
+        measurements = self['weather_live_conditions_measurements']
+
+        self.measurements = tuple(measurements)
+        self.columns = tuple(self['weather_live_basic_data']) + self.measurements
+        self.aliases = FrozenDict({alternative_name: measurement for measurement, alternative_names in measurements.items() for alternative_name in alternative_names})
+        self.sensor_ids = FrozenDict({alternative_name: measurement for alternative_name, measurement in self.aliases.items() if isinstance(alternative_name, int)})
+
+        stations = {}
+
+        for farm, farm_data in self['farms'].items():
+            for station in farm_data or ():
+                stations.setdefault(station['code'], []).append(FrozenDict(station, farm = farm))
+
+        self.stations = FrozenDict({code: tuple(code_stations) for code, code_stations in stations.items()})
+
+    def __setattr__(self, name, value):
+        # the lookup tables are only set while the config is built
+        if name in self.__dict__:
+            raise TypeError("The config can't be changed")
+
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        return (Config, (thaw(self),))
+
+def thaw(value):
+    # the plain data (dicts and lists) of a frozen value, used for pickling
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+
+    return value
+
+def read_cache(path, signature):
+    try:
+        with open(f'{path}.cache', 'rb') as cache:
+            cached_signature, data = pickle.load(cache)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return None
+
+    return data if cached_signature == signature else None
+
+def write_cache(path, signature, data):
+    # the cache is only an optimization, a read-only directory just means the yaml is parsed every time
+    try:
+        with open(f'{path}.cache.tmp', 'wb') as cache:
+            pickle.dump((signature, data), cache, protocol = pickle.HIGHEST_PROTOCOL)
+
+        os.replace(f'{path}.cache.tmp', f'{path}.cache')
+    except OSError as e:
+        print(f"Config cache could not be written: {e}")
+
+_configs = {} # path -> (signature, Config)
+
+def load_config(path = None):
+    # the Config is kept in memory for the lifetime of the process and only built again when the file changes
+    # long-running processes (run/daemon.py) therefore parse 'config.yaml' once instead of once per collector instance
+    path = path or os.getenv('CONFIG')
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _configs.get(path)
+
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    data = read_cache(path, signature)
+
+    cached_data = data is not None
+
+    if data is None:
+        with open(path, 'r') as conf:
+            data = yaml.safe_load(conf)
+
+    config = Config(data) # validated once, by the Config
+
+    # only a valid config is cached
+    if not cached_data:
+        write_cache(path, signature, data)
+
+    _configs[path] = (signature, config)
+
+    return config
@@ -0,0 +1,155 @@
+import asyncio, time, requests
+
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from .throttle import get_host
+
+class HostLimiter:
+    # keeps the requests in flight to every host within the limit of the rate controller (export/throttle.py)
+    def __init__(self, controller):
+        self._controller = controller
+        self._in_flight = {}
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, host):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight.get(host, 0) < self._controller.get_limit(host))
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+
+        delay = self._controller.get_delay(host)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, host):
+        async with self._condition:
+            self._in_flight[host] -= 1
+            self._condition.notify_all()
+
+class AsyncFetcher:
+    # fetches many API urls concurrently using asyncio
+    # every request goes through one shared 'requests.Session', so the connections to the same host (SoDa, Open-Meteo) are kept alive and reused
+    # the number of requests in flight is bounded by 'concurrency', which is also the size of the connection pool,
+    # and per host by the rate controller, when there is one (the latency and status of every request are reported to it)
+    def __init__(self, concurrency = 16, timeout = 10, controller = None):
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._controller = controller
+
+        self._session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections = concurrency, pool_maxsize = concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def controller(self):
+        return self._controller
+
+    @property
+    def session(self):
+        return self._session
+
+    def close(self):
+        self._session.close()
+
+    async def fetch(self, semaphore, limiter, url, station):
+        # the blocking 'requests' call is executed in a worker thread (the executor of 'fetch_all'), so the event loop can wait for many of them at once
+        host = get_host(url)
+
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire(host)
+
+            start = time.perf_counter()
+
+            try:
+                response = await asyncio.to_thread(self._session.get, url, timeout = self._timeout)
+
+                if self._controller is not None:
+                    self._controller.record(host, time.perf_counter() - start, response.status_code)
+
+                return response, station, url
+            except requests.RequestException as e:
+                if self._controller is not None:
+                    self._controller.record(host, time.perf_counter() - start, None)
+
+                # the exception text holds the url, whose query string can hold credentials (SoDa), only its type is printed
+                print(f"Request failed for station {station.station_number} ({station.code}) on {host}: {type(e).__name__}")
+                return None, station, url
+            finally:
+                if limiter is not None:
+                    await limiter.release(host)
+
+    def fetch_all(self, jobs, failed = None):
+        # jobs: iterable of (url, station)
+        # yields (response, station, url) as soon as each request completes, not in submission order
+        # requests that failed are skipped, so one dead endpoint does not stop the rest, and reported to 'failed(station, url, reason)'
+        jobs = list(jobs)
+
+        if not jobs:
+            return
+
+        loop = asyncio.new_event_loop()
+
+        # one worker thread per request in flight, the default executor of asyncio is smaller ('min(32, cpu count + 4)') and would queue the requests
+        executor = ThreadPoolExecutor(max_workers = self._concurrency)
+        loop.set_default_executor(executor)
+
+        try:
+            semaphore = asyncio.Semaphore(self._concurrency)
+            limiter = HostLimiter(self._controller) if self._controller is not None else None
+            pending = {loop.create_task(self.fetch(semaphore, limiter, url, station)) for url, station in jobs}
+
+            while pending:
+                done, pending = loop.run_until_complete(asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED))
+
+                for task in done:
+                    response, station, url = task.result()
+
+                    if response is None:
+                        if failed is not None:
+                            failed(station, url, 'request failed')
+
+                        continue
+
+                    yield response, station, url
+        finally:
+            remaining = asyncio.all_tasks(loop)
+
+            for task in remaining:
+                task.cancel()
+
+            if remaining:
+                loop.run_until_complete(asyncio.gather(*remaining, return_exceptions = True))
+
+            loop.close()
+
+            # a request still running after a cancel ends by its own timeout, it is not waited for
+            executor.shutdown(wait = False, cancel_futures = True)
+
+            # the limits learned in this run are kept for the next ones
+            if self._controller is not None:
+                self._controller.save()
+
+_fetchers = {} # (concurrency, timeout, controller) -> AsyncFetcher
+
+def get_fetcher(concurrency = 16, timeout = 10, controller = None):
+    # one fetcher (and so one connection pool) is shared by every collector of the process, so warm connections survive between cycles
+    fetcher = _fetchers.get((concurrency, timeout, id(controller)))
+
+    if fetcher is None:
+        fetcher = AsyncFetcher(concurrency, timeout, controller)
+        _fetchers[(concurrency, timeout, id(controller))] = fetcher
+
+    return fetcher
@@ -0,0 +1,119 @@
+import os, json, time, threading
+
+# health of every station (circuit breaker), shared by the spiders and the API collectors and kept in a json file between runs
+# - closed: the station works, it is requested every cycle
+# - open: the station failed 'failures_to_open' times in a row (timeout, HTTP error, offline, response without data ...),
+#   it is not requested until its back-off ends, the back-off doubles with every failure (from 'backoff' up to 'max_backoff' seconds)
+# - half-open: the back-off ended, the station is requested once more (probe), a success closes it and a failure opens it again for longer
+
+class HealthRegistry:
+    def __init__(self, path, failures_to_open = 2, backoff = 600, max_backoff = 21600):
+        self._path = path
+        self._failures_to_open = failures_to_open
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+
+        self._stations = {} # station key (url) -> {'failures', 'open_until', 'reason'}
+        self._changed = set()
+        self._lock = threading.Lock()
+
+        self.load()
+
+    def get_state(self, key):
+        return self._stations.get(key) or {'failures': 0, 'open_until': 0, 'reason': None}
+
+    def get_status(self, key, now = None):
+        state = self.get_state(key)
+
+        if state['failures'] < self._failures_to_open:
+            return 'closed'
+
+        return 'open' if (now or time.time()) < state['open_until'] else 'half-open'
+
+    def allow(self, key, now = None):
+        # False while the station is open, the planner then skips it
+        return self.get_status(key, now) != 'open'
+
+    def success(self, key):
+        with self._lock:
+            if key in self._stations:
+                del self._stations[key]
+                self._changed.add(key)
+
+    def failure(self, key, reason = None, now = None):
+        with self._lock:
+            state = dict(self.get_state(key))
+            state['failures'] += 1
+            state['reason'] = reason
+
+            if state['failures'] >= self._failures_to_open:
+                backoff = min(self._max_backoff, self._backoff * 2 ** (state['failures'] - self._failures_to_open))
+                state['open_until'] = (now or time.time()) + backoff
+
+            self._stations[key] = state
+            self._changed.add(key)
+
+    def load(self):
+        if not self._path or not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding = 'utf-8') as health_file:
+                self._stations = json.load(health_file)
+        except (OSError, ValueError) as e:
+            print(f"Station health could not be loaded, every station is requested: {e}")
+
+    def save(self):
+        # only the stations of this process are written, over the latest file (the collectors may run in different processes)
+        if not self._path:
+            return
+
+        with self._lock:
+            stations = {}
+
+            if os.path.exists(self._path):
+                try:
+                    with open(self._path, 'r', encoding = 'utf-8') as health_file:
+                        stations = json.load(health_file)
+                except (OSError, ValueError):
+                    stations = {}
+
+            for key in self._changed:
+                if key in self._stations:
+                    stations[key] = self._stations[key]
+                else:
+                    stations.pop(key, None)
+
+            self._changed.clear()
+
+            directory = os.path.dirname(self._path)
+
+            if directory:
+                os.makedirs(directory, exist_ok = True)
+
+            with open(f'{self._path}.tmp', 'w', encoding = 'utf-8') as health_file:
+                json.dump(stations, health_file, ensure_ascii = False, indent = 2, sort_keys = True)
+
+            os.replace(f'{self._path}.tmp', self._path)
+
+_registries = {} # state path -> HealthRegistry
+
+def get_health(config):
+    # one registry per process and state file, None when it is disabled in the config
+    settings = config.get('station_health')
+
+    if settings is None or settings.get('enabled') is not True:
+        return None
+
+    registry = _registries.get(settings['state'])
+
+    if registry is None:
+        registry = HealthRegistry(
+            settings['state'],
+            failures_to_open = settings['failures_to_open'],
+            backoff = settings['backoff'],
+            max_backoff = settings['max_backoff'],
+        )
+        _registries[settings['state']] = registry
+
+    return registry
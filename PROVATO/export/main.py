@@ -1,29 +1,31 @@
 from dotenv import load_dotenv
 load_dotenv() # load environment variables
 
-import yaml, os, requests, logging
+import os, logging
 
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
 
 from zoneinfo import ZoneInfo
 
+from .config import load_config
+from .fetcher import get_fetcher
+from .health import get_health
+from .planner import RequestPlanner
+from .record import build_record
+from .throttle import get_controller
+
 class WeatherData(ABC):
     def __init__(self):
-        self._farm = None
-        self._source = None
-        self._timedata = None
+        # only the state of the whole run is kept here, every record is built on its own ('build_record')
         self._crawled = datetime.now(ZoneInfo("Europe/Athens"))
-        self._city = None
-        self._nomos = None
-        self._station_number = None
         
-        self._stations = []
+        self._planner = None
+        self._failed_stations = {} # station -> reason, the stations with a failed request in the last API run
 
-        self._all_measurements = {}
+        self._config = load_config()
 
-        with open(os.getenv('CONFIG'), 'r') as conf:
-            self._config = yaml.safe_load(conf)
+        self._health = get_health(self.config) # None when the station health registry is disabled
 
         # logging.basicConfig(
         #     now = datetime.now()
@@ -38,173 +40,135 @@ class WeatherData(ABC):
 
     # ------------------------------------
 
-    @property
-    def all_measurements(self):
-        return self._all_measurements
-    
     @property
     def config(self):
         return self._config
     
     @property
-    def stations(self):
-        return self._stations
-
-    @property
-    def farm(self):
-        return self._farm
+    def planner(self):
+        return self._planner
 
     @property
-    def source(self):
-        return self._source
+    def failed_stations(self):
+        return self._failed_stations
 
     @property
-    def timedata(self):
-        return self._timedata
+    def stations(self):
+        return self._planner.stations if self._planner is not None else []
 
     @property
     def crawled(self):
         return self._crawled
 
     @property
-    def city(self):
-        return self._city
+    def health(self):
+        return self._health
 
-    @property
-    def nomos(self):
-        return self._nomos
-    
-    @property
-    def station_number(self):
-        return self._station_number
-    
     # ------------------------------------
 
-    def set_farm(self, value):
-        self._farm = value
-
-    def set_source(self, value):
-        self._source = value
-
-    def set_timedata(self, value):
-        self._timedata = value
-
-    def set_city(self, value):
-        self._city = value
-
-    def set_nomos(self, value):
-        self._nomos = value
-
-    def set_station_number(self, value):
-        self._station_number = value
-
-    def set_stations(self, stations):
-        self._stations.append(stations)
-
-    def set_measurements(self, value):
-        self._all_measurements.update(value)
+    def set_planner(self, planner):
+        self._planner = planner
 
     # ------------------------------------
 
-    def run_basic(self):
-        if self.config['get_weather_basic_data'] is True:
-            self.set_measurements({
-                key: getattr(self, key, None) for key in self.config['weather_live_basic_data']
-            })
+    def build_record(self, station, timedata, measurements):
+        return build_record(self.config, station, self.crawled, timedata, measurements)
+
+    def get_measurements(self, get_data):
+        # {measurement: value} of one record
+        # get_data(measurement, alternative_names, measurements found so far) returns {measurement: value}, or None when the measurement is not found
+        measurements = {}
 
-    def run_measurements_scraping(self, response):
         if self.config['get_weather_measurements'] is True:
             for measurement, measurement_alternative_names in self.config['weather_live_conditions_measurements'].items():
-                result = self.get_data(response, measurement, measurement_alternative_names) # returned data: {'measurement': 'value'}
+                result = get_data(measurement, measurement_alternative_names, measurements)
 
                 if result is None:
-                    self.set_measurements({measurement: None})
+                    measurements[measurement] = None
                     continue
 
-                self.set_measurements(result)
+                measurements.update(result)
 
-    def run_measurements_api(self, name, record):
-        if self.config['get_weather_measurements'] is True:
-            for measurement, _ in self.config['weather_live_conditions_measurements'].items():
-                if measurement == name:
-                    self.set_measurements({measurement: record})
-                    break
+        return measurements
 
-    def run_measurements_api_without_name(self, record):
-        if self.config['get_weather_measurements'] is True:
-            for measurement, _ in self.config['weather_live_conditions_measurements'].items():
-                for item in record:
-                    if item == measurement:
-                        self.set_measurements({measurement: record[item]})
-                        break
+    def get_measurements_api(self, record):
+        # the measurements of an API record that already uses the measurement names
+        if self.config['get_weather_measurements'] is not True:
+            return {}
 
-    def yield_all_items(self, all_measurements_values):
-        yield all_measurements_values
+        return {measurement: record[measurement] for measurement in self.config.measurements if measurement in record}
 
-    def init_get_stations(self, source):
-        for farm, farm_data in self.config['farms'].items():
-            general = list(filter(lambda find_source: find_source.get('code') == self.config['weather_websites'][source]['code'], farm_data))
-            
-            if general is None or not general:
-                continue
+    def station_ok(self, station):
+        if self.health is not None:
+            self.health.success(station.url)
 
-            for st in general:
-                st['farm'] = farm
+    def station_failed(self, station, reason):
+        print(f"Station {station.station_number} ({station.code}) failed: {reason}")
 
-            self.set_stations(general)
+        if self.health is not None:
+            self.health.failure(station.url, reason)
 
-    def exporter_start_requests(self, source, req):
-        for farm, farm_data in self.config['farms'].items():
-            data = list(filter(lambda find_source: find_source['code'] == self.config['weather_websites'][source]['code'], farm_data))
+    def save_health(self):
+        if self.health is not None:
+            self.health.save()
 
-            if not data or data is None:
-                continue
+    def request_failed(self, failure):
+        # errback of the scrapy requests (timeout, connection error, HTTP error ...)
+        # a request dropped on purpose (the conditional fetch middleware found no new observation) is not a failure of the station
+        from scrapy.exceptions import IgnoreRequest
+
+        if failure.check(IgnoreRequest):
+            return
 
-            for item in data:
-                self.set_stations(item)
+        self.station_failed(failure.request.meta['station'], repr(failure.value))
 
-            for station in self.stations:
-                meta_data = {}
+    def yield_all_items(self, all_measurements_values):
+        yield all_measurements_values
 
-                for item in self.config['weather_live_basic_data']:
-                    if item == 'farm':
-                        meta_data.update({item: farm})
-                        continue
+    def init_get_stations(self, source):
+        # the stations and requests of the source are planned once per run
+        if self.planner is None or self.planner.code != self.config['weather_websites'][source]['code']:
+            self.set_planner(RequestPlanner(self.config, source, self.health))
 
-                    if station.get(item) is None:
-                        meta_data.update({item: None})
-                        continue
+    def exporter_start_requests(self, source, req):
+        # one request per station, the station travels with its request (response.meta['station'])
+        self.init_get_stations(source)
 
-                    meta_data.update({item: station[item]})
+        for url, station in self.planner.issue(self.planner.plan()):
+            yield req(url, self.parse, errback = self.request_failed, meta = {'station': station})
 
-                yield req(station['url'], self.parse, meta = meta_data)
+    def build_api_urls(self, station):
+        # urls requested for one station, collectors that split their requests into several windows override it
+        return [os.getenv(station.url)]
 
     def exporter_start_requests_api(self):
-        if self.stations is None or not self.stations:
+        # all stations are requested concurrently, and every (response, station, url) is yielded as soon as its request completes
+        # a failed request or an HTTP error counts as a failure of the station, the collector reports the stations that returned data ('station_ok')
+        # a station is reported once per run, whatever the number of its requests (chunks) that failed
+        self._failed_stations = {}
+
+        if not self.stations:
             return
-        
-        for farm in self.stations:
-            for station in farm:
-                request = None
 
-                if 'SODA' in station.get('url'):
-                    start = self.crawled - timedelta(hours = 1, minutes = 30)
+        jobs = list(self.planner.issue(self.planner.plan(self.build_api_urls)))
 
-                    start_date = start.strftime('%Y-%m-%d %H:%M:%S').replace(' ', '%20')
-                    end_date = self.crawled.strftime('%Y-%m-%d %H:%M:%S').replace(' ', '%20')
+        fetcher = get_fetcher(self.config['api_fetcher']['concurrency'], self.config['api_fetcher']['timeout'], get_controller(self.config))
 
-                    url = station.get('url')
+        def failed(station, url, reason):
+            self._failed_stations.setdefault(station, reason)
+
+        for response, station, url in fetcher.fetch_all(jobs, failed):
+            if not response.ok:
+                failed(station, url, f'HTTP {response.status_code}')
+                continue
 
-                    request = requests.get(f'{os.getenv(f'{url}_path')}?start_date={start_date}&end_date={end_date}&username={os.getenv(f'{url}_username')}&password={os.getenv(f'{url}_password')}', timeout = 10)
-                else:
-                    request = requests.get(os.getenv(station.get('url')), timeout = 10)
+            yield response, station, url
 
-                yield request, station
+        for station, reason in self._failed_stations.items():
+            self.station_failed(station, reason)
 
-                # if request.status_code == 200:
-                #     print('elaa')
-                # else:
-                #     print('skata')
+        self.planner.report()
+        self.save_health()
 
     # def clean_measurements(self):
     #     self.__all_measurements.clear()
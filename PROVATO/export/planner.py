@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+
+@dataclass(frozen = True)
+class Station:
+    # one station of the 'farms' config section, passed along with its requests (scrapy: response.meta['station'])
+    farm: str
+    url: str
+    source: str
+    city: str
+    nomos: str
+    code: str
+    station_number: int
+
+    @classmethod
+    def from_config(cls, station):
+        return cls(
+            farm = station.get('farm'),
+            url = station.get('url'),
+            source = station.get('source'),
+            city = station.get('city'),
+            nomos = station.get('nomos'),
+            code = station.get('code'),
+            station_number = station.get('station_number'),
+        )
+
+class RequestPlanner:
+    # the stations of one source and the requests of a run, built once: every station appears once, whatever the number of farms,
+    # and a url is requested only once, even if several stations or chunks produce it
+    # stations that the health registry (export/health.py) holds open are not requested until their back-off ends
+    def __init__(self, config, source, health = None):
+        self._code = config['weather_websites'][source]['code']
+        self._health = health
+        self._stations = []
+        self._planned = 0
+        self._issued = 0
+        self._skipped = 0
+
+        seen = set()
+
+        for station in config.stations.get(self._code, ()):
+            station = Station.from_config(station)
+
+            if station in seen:
+                continue
+
+            seen.add(station)
+            self._stations.append(station)
+
+    @property
+    def code(self):
+        return self._code
+
+    @property
+    def stations(self):
+        return self._stations
+
+    @property
+    def planned(self):
+        return self._planned
+
+    @property
+    def issued(self):
+        return self._issued
+
+    @property
+    def skipped(self):
+        return self._skipped
+
+    def plan(self, build_urls = None):
+        # [(url, station)] without duplicate urls, 'build_urls(station)' returns the urls of a station (default: the station url)
+        requests = []
+        seen = set()
+
+        for station in self._stations:
+            if self._health is not None and not self._health.allow(station.url):
+                print(f"Skipping offline station {station.station_number} ({station.code}) until its back-off ends")
+                self._skipped += 1
+                continue
+
+            for url in (build_urls(station) if build_urls is not None else [station.url]):
+                if url in seen:
+                    print(f"Skipping duplicate request for station {station.station_number} ({station.code})") # the url can hold credentials
+                    continue
+
+                seen.add(url)
+                requests.append((url, station))
+
+        self._planned += len(requests)
+
+        return requests
+
+    def issue(self, requests):
+        # yields the planned requests, counting the ones that were really issued
+        for request in requests:
+            self._issued += 1
+
+            yield request
+
+    def report(self):
+        print(f"{self._code}: {self._planned} requests planned, {self._issued} issued, {len(self._stations)} stations, {self._skipped} skipped as offline")
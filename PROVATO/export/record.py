@@ -0,0 +1,54 @@
+class Record:
+    # one weather record (one row of the staging files): the basic data of 'weather_live_basic_data' and the measurements of 'weather_live_conditions_measurements'
+    # every response (or API record) builds its own Record, nothing is shared between responses,
+    # so the spiders can process many responses at the same time without mixing the fields of different stations
+    __slots__ = ('_columns', '_values')
+
+    def __init__(self, columns, values):
+        object.__setattr__(self, '_columns', tuple(columns))
+        object.__setattr__(self, '_values', tuple(values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A record can't be changed")
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def values(self):
+        return self._values
+
+    def get(self, column, default = None):
+        try:
+            return self._values[self._columns.index(column)]
+        except ValueError:
+            return default
+
+    def as_dict(self):
+        # the scrapy item of the record (a new dict every time)
+        return dict(zip(self._columns, self._values))
+
+    def __repr__(self):
+        return f'Record({self.as_dict()})'
+
+def build_record(config, station, crawled, timedata, measurements):
+    # the basic data come from the station (farm, source, city, nomos, station_number), 'timedata' and 'crawled',
+    # measurements is {measurement: value}, a measurement missing from it is None
+    # like the config, 'get_weather_basic_data' and 'get_weather_measurements' select which fields the record has
+    columns = []
+    values = []
+
+    if config['get_weather_basic_data'] is True:
+        basic = {'timedata': timedata, 'crawled': crawled}
+
+        for key in config['weather_live_basic_data']:
+            columns.append(key)
+            values.append(basic[key] if key in basic else getattr(station, key, None))
+
+    if config['get_weather_measurements'] is True:
+        for measurement in config.measurements:
+            columns.append(measurement)
+            values.append(measurements.get(measurement))
+
+    return Record(columns, values)
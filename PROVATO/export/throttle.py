@@ -0,0 +1,136 @@
+import os, json, threading
+
+from urllib.parse import urlparse
+
+# adaptive rate controller, shared by the scrapy downloader (extensions.py) and the API fetcher (export/fetcher.py)
+# every host ('wunderground.com', 'penteli.meteo.gr', the SoDa host, 'api.open-meteo.com' ...) has its own concurrency limit and delay:
+# - while the latency of the host stays flat, the limit grows by one request per round of 'limit' responses (additive increase)
+# - a 429, a 5xx or a failed request halves the limit and doubles the delay, a latency spike cuts the limit by a quarter (multiplicative decrease)
+# the learned limits are kept in a json file between runs, so every run starts at the limit the host tolerated last time
+
+def get_host(url):
+    host = (urlparse(url).hostname or '').lower()
+
+    return host[4:] if host.startswith('www.') else host
+
+class RateController:
+    def __init__(self, path, initial_concurrency = 4, min_concurrency = 1, max_concurrency = 16, latency_spike = 2.0, max_delay = 30):
+        self._path = path
+        self._initial = initial_concurrency
+        self._min = min_concurrency
+        self._max = max_concurrency
+        self._spike = latency_spike
+        self._max_delay = max_delay
+
+        self._hosts = {} # host -> {'limit', 'delay', 'latency' (moving average), 'baseline' (usual latency)}
+        self._changed = set()
+        self._lock = threading.Lock() # the daemon records from the reactor thread and from the API collector threads
+
+        self.load()
+
+    def get_state(self, host):
+        state = self._hosts.get(host)
+
+        if state is None:
+            state = {'limit': float(self._initial), 'delay': 0.0, 'latency': None, 'baseline': None}
+            self._hosts[host] = state
+
+        return state
+
+    def get_limit(self, host):
+        with self._lock:
+            return max(self._min, int(self.get_state(host)['limit']))
+
+    def get_delay(self, host):
+        with self._lock:
+            return self.get_state(host)['delay']
+
+    def record(self, host, latency, status = None):
+        # status None means the request failed (timeout, connection error ...)
+        with self._lock:
+            state = self.get_state(host)
+            self._changed.add(host)
+
+            if status is None or status == 429 or status >= 500:
+                state['limit'] = max(self._min, state['limit'] / 2)
+                state['delay'] = min(self._max_delay, max(state['delay'] * 2, 0.25))
+                return
+
+            if latency is None:
+                return
+
+            state['latency'] = latency if state['latency'] is None else 0.8 * state['latency'] + 0.2 * latency
+
+            # the usual latency follows improvements at once and slow changes slowly, so a lasting change does not look like a spike forever
+            if state['baseline'] is None or state['latency'] < state['baseline']:
+                state['baseline'] = state['latency']
+            else:
+                state['baseline'] += 0.01 * (state['latency'] - state['baseline'])
+
+            if state['latency'] > self._spike * state['baseline']:
+                state['limit'] = max(self._min, state['limit'] * 0.75)
+                return
+
+            state['limit'] = min(self._max, state['limit'] + 1 / state['limit'])
+            state['delay'] = state['delay'] / 2 if state['delay'] > 0.01 else 0.0
+
+    def load(self):
+        if not self._path or not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding = 'utf-8') as state_file:
+                self._hosts = json.load(state_file)
+        except (OSError, ValueError) as e:
+            print(f"Rate controller state could not be loaded, starting from the initial limits: {e}")
+
+    def save(self):
+        # only the hosts of this process are written, over the latest file, because the spiders and the API collectors may run in different processes
+        if not self._path:
+            return
+
+        with self._lock:
+            hosts = {}
+
+            if os.path.exists(self._path):
+                try:
+                    with open(self._path, 'r', encoding = 'utf-8') as state_file:
+                        hosts = json.load(state_file)
+                except (OSError, ValueError):
+                    hosts = {}
+
+            hosts.update({host: self._hosts[host] for host in self._changed})
+
+            directory = os.path.dirname(self._path)
+
+            if directory:
+                os.makedirs(directory, exist_ok = True)
+
+            with open(f'{self._path}.tmp', 'w', encoding = 'utf-8') as state_file:
+                json.dump(hosts, state_file, indent = 2, sort_keys = True)
+
+            os.replace(f'{self._path}.tmp', self._path)
+
+_controllers = {} # state path -> RateController
+
+def get_controller(config):
+    # one controller per process and state file, None when the controller is disabled in the config
+    settings = config.get('rate_controller')
+
+    if settings is None or settings.get('enabled') is not True:
+        return None
+
+    controller = _controllers.get(settings['state'])
+
+    if controller is None:
+        controller = RateController(
+            settings['state'],
+            initial_concurrency = settings['initial_concurrency'],
+            min_concurrency = settings['min_concurrency'],
+            max_concurrency = settings['max_concurrency'],
+            latency_spike = settings['latency_spike'],
+            max_delay = settings['max_delay'],
+        )
+        _controllers[settings['state']] = controller
+
+    return controller
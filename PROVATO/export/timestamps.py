@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from zoneinfo import ZoneInfo
+
+# fast timestamp parsing shared by the collectors and the preprocessing
+# every source has its own format, parsed by hand or with 'fromisoformat' instead of 'strptime' ('strptime' is only the fallback)
+# results are memoized, because the same timestamps are parsed again and again (all the sensors of a SoDa response, every row of a station)
+
+ATHENS = ZoneInfo("Europe/Athens")
+
+MONTHS = {
+    'january': 1,
+    'february': 2,
+    'march': 3,
+    'april': 4,
+    'may': 5,
+    'june': 6,
+    'july': 7,
+    'august': 8,
+    'september': 9,
+    'october': 10,
+    'november': 11,
+    'december': 12,
+}
+
+@lru_cache(maxsize = 65536)
+def parse_soda(timedata):
+    # '2025-07-29 01:00:00' (Athens local time)
+    return datetime.fromisoformat(timedata)
+
+@lru_cache(maxsize = 65536)
+def parse_meteo(timedata):
+    # '29/07/2025 01:00' (Athens local time)
+    try:
+        day, month, rest = timedata.split('/')
+        year, clock = rest.split(' ')
+        hour, minute = clock.split(':')
+
+        return datetime(int(year), int(month), int(day), int(hour), int(minute))
+    except ValueError:
+        return datetime.strptime(timedata, "%d/%m/%Y %H:%M")
+
+@lru_cache(maxsize = 65536)
+def parse_wu(timedata):
+    # '1:05 AM on July 29, 2025 EEST' (Athens local time)
+    timedata = timedata.replace("EEST", "").replace("EET", "").strip()
+
+    try:
+        clock, meridiem, _, month, day, year = timedata.split()
+        hour, minute = clock.split(':')
+        hour = int(hour) % 12 + (12 if meridiem.upper() == 'PM' else 0)
+
+        return datetime(int(year), MONTHS[month.lower()], int(day.rstrip(',')), hour, int(minute))
+    except (ValueError, KeyError):
+        return datetime.strptime(timedata, "%I:%M %p on %B %d, %Y")
+
+@lru_cache(maxsize = 65536)
+def parse_open_meteo(timedata):
+    # unix time ('1753740000') or ISO time in GMT ('2025-07-28T22:00'), converted to Athens local time
+    timedata = str(timedata).strip()
+
+    if timedata.isdigit():
+        dt = datetime.fromtimestamp(int(timedata), tz = timezone.utc)
+    else:
+        dt = datetime.fromisoformat(timedata)
+
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo = timezone.utc)
+
+    return dt.astimezone(ATHENS).replace(tzinfo = None)
+
+PARSERS = {
+    'soda': parse_soda,
+    'meteo': parse_meteo,
+    'wu': parse_wu,
+    'open-meteo': parse_open_meteo,
+}
+
+@lru_cache(maxsize = 65536)
+def convert(timedata, source):
+    # timestamp of the source -> '%Y-%m-%d %H:%M:%S.%f' (Athens local time), None if the source is unknown
+    parser = PARSERS.get(source)
+
+    if parser is None:
+        return None
+
+    return parser(timedata).isoformat(sep = ' ', timespec = 'microseconds')
+
+@lru_cache(maxsize = 65536)
+def to_epoch(cleaned):
+    # '%Y-%m-%d %H:%M:%S.%f' (Athens local time) -> unix time in seconds
+    return int(datetime.fromisoformat(cleaned).replace(tzinfo = ATHENS).timestamp())
+
+def benchmark(number = 100000):
+    # microbenchmark of the fast paths against 'strptime'
+    # python3 -m export.timestamps
+    import timeit
+
+    samples = [
+        ('soda', '2025-07-29 01:00:00', lambda value: datetime.strptime(value, "%Y-%m-%d %H:%M:%S"), parse_soda.__wrapped__),
+        ('meteo', '29/07/2025 01:00', lambda value: datetime.strptime(value, "%d/%m/%Y %H:%M"), parse_meteo.__wrapped__),
+        ('wu', '1:05 AM on July 29, 2025', lambda value: datetime.strptime(value, "%I:%M %p on %B %d, %Y"), parse_wu.__wrapped__),
+    ]
+
+    for source, value, slow, fast in samples:
+        assert slow(value) == fast(value)
+
+        slow_time = timeit.timeit(lambda: slow(value), number = number)
+        fast_time = timeit.timeit(lambda: fast(value), number = number)
+        memoized_time = timeit.timeit(lambda: convert(value, source), number = number)
+
+        print(f"{source}: strptime {slow_time:.3f}s | fast path {fast_time:.3f}s ({slow_time / fast_time:.1f}x) | memoized {memoized_time:.3f}s ({slow_time / memoized_time:.1f}x)")
+
+if __name__ == '__main__':
+    benchmark()
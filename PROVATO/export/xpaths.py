@@ -0,0 +1,199 @@
+import time
+
+from lxml import etree, html
+
+class SelectorSet:
+    # all the XPaths of a '*_live_data_paths' config section, compiled once with lxml when the spider starts
+    # nested paths are named with dots ('temperature.value'), empty paths (null) are skipped
+    # an invalid XPath raises a ValueError at load time instead of failing on every response
+    def __init__(self, paths):
+        self._selectors = {} # name -> compiled XPath
+        self._timings = {} # name -> [evaluations, total seconds]
+
+        self.compile(paths)
+
+    @property
+    def names(self):
+        return list(self._selectors)
+
+    def compile(self, paths, prefix = ''):
+        for key, path in paths.items():
+            name = f'{prefix}{key}'
+
+            if isinstance(path, dict):
+                self.compile(path, f'{name}.')
+                continue
+
+            if path is None:
+                continue
+
+            try:
+                self._selectors[name] = etree.XPath(path)
+            except etree.XPathSyntaxError as e:
+                raise ValueError(f"Invalid XPath '{name}': {path} ({e})")
+
+            self._timings[name] = [0, 0.0]
+
+    def select(self, name, node):
+        # all the results of the selector, evaluated on an lxml element ('get_tree')
+        start = time.perf_counter()
+
+        try:
+            result = self._selectors[name](node)
+        finally:
+            timing = self._timings[name]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+        if not isinstance(result, list):
+            return [result]
+
+        return result
+
+    def extract(self, name, node):
+        # the first result as a string (like '.get()' of scrapy), None if there is no result
+        for result in self.select(name, node):
+            if isinstance(result, str):
+                return str(result)
+
+            return etree.tostring(result, encoding = 'unicode', with_tail = False)
+
+        return None
+
+    def extract_all(self, node, names = None):
+        # {name: first result} of every selector (or only of 'names'), all evaluated on the same tree
+        return {name: self.extract(name, node) for name in (names or self._selectors)}
+
+    def get_timings(self):
+        # [(name, evaluations, mean milliseconds)], slowest first
+        timings = [(name, count, total / count * 1000) for name, (count, total) in self._timings.items() if count > 0]
+
+        return sorted(timings, key = lambda timing: timing[2], reverse = True)
+
+    def report(self):
+        # a selector getting much slower usually means the markup of the website changed
+        for name, count, mean in self.get_timings():
+            print(f"{name}: {count} evaluations, {mean:.3f} ms per evaluation")
+
+def get_tree(response):
+    # the lxml tree scrapy already built for the response, so the document is parsed only once
+    return response.selector.root
+
+def find_element(body, marker):
+    # (start, end) byte offsets of the element containing the first occurrence of 'marker', found without parsing the page:
+    # back to the '<' of the tag, then forward over the opening and closing tags of the same name until they balance
+    # None if the marker or the end of the element is not found
+    position = body.find(marker)
+
+    if position < 0:
+        return None
+
+    start = body.rfind(b'<', 0, position + 1)
+
+    if start < 0:
+        return None
+
+    name_end = start + 1
+
+    while name_end < len(body) and (body[name_end:name_end + 1].isalnum() or body[name_end:name_end + 1] in (b'-', b'_')):
+        name_end += 1
+
+    name = body[start + 1:name_end]
+
+    if not name:
+        return None
+
+    opening = b'<' + name
+    closing = b'</' + name
+    depth = 1
+    cursor = name_end
+
+    while depth > 0:
+        close = body.find(closing, cursor)
+
+        if close < 0:
+            return None
+
+        open_ = body.find(opening, cursor, close)
+
+        if open_ >= 0:
+            # '<div' must not match '<divider'
+            if body[open_ + len(opening):open_ + len(opening) + 1] in (b' ', b'>', b'/', b'\t', b'\r', b'\n'):
+                depth += 1
+
+            cursor = open_ + len(opening)
+            continue
+
+        # '</div' must not match '</divider'
+        if body[close + len(closing):close + len(closing) + 1] in (b'>', b' ', b'\t', b'\r', b'\n'):
+            depth -= 1
+
+        cursor = close + len(closing)
+
+    end = body.find(b'>', cursor)
+
+    return (start, end + 1) if end >= 0 else None
+
+def get_fragment_tree(response, markers, optional = None):
+    # lxml tree of only the elements containing the markers (in page order), much smaller than the whole page
+    # the elements of 'optional' markers are added when they are found
+    # None if one of the 'markers' is not found, the page must then be parsed whole ('get_tree')
+    # the tree is kept in the meta of the response, so the downloader middleware ('get_observation_time') and 'parse' build it only once
+    try:
+        trees = response.meta.setdefault('fragment_trees', {})
+    except AttributeError: # a response without a request has no meta
+        return build_fragment_tree(response, markers, optional)
+
+    key = (tuple(markers), tuple(optional or ()))
+
+    if key not in trees:
+        trees[key] = build_fragment_tree(response, markers, optional)
+
+    return trees[key]
+
+def build_fragment_tree(response, markers, optional = None):
+    body = response.body
+    ranges = []
+
+    for marker in markers:
+        found = find_element(body, marker.encode('utf-8'))
+
+        if found is None:
+            return None
+
+        ranges.append(found)
+
+    for marker in optional or []:
+        found = find_element(body, marker.encode('utf-8'))
+
+        if found is not None:
+            ranges.append(found)
+
+    # elements inside other elements are kept only once
+    fragments = []
+
+    for start, end in sorted(ranges):
+        if fragments and start < fragments[-1][1]:
+            fragments[-1] = (fragments[-1][0], max(end, fragments[-1][1]))
+            continue
+
+        fragments.append((start, end))
+
+    fragment = b''.join(body[start:end] for start, end in fragments)
+    parser = html.HTMLParser(encoding = response.encoding)
+
+    return html.document_fromstring(fragment, parser = parser)
+
+_selector_sets = {} # (id(config), section) -> (config, selector set)
+
+def get_selectors(config, section):
+    # one selector set per loaded config and section, compiled the first time it is needed
+    cached = _selector_sets.get((id(config), section))
+
+    if cached is not None and cached[0] is config:
+        return cached[1]
+
+    selectors = SelectorSet(config[section])
+    _selector_sets[(id(config), section)] = (config, selectors)
+
+    return selectors
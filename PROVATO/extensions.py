@@ -0,0 +1,73 @@
+# Define here the extensions of the project
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from .export.config import load_config
+from .export.throttle import get_controller, get_host
+
+
+class RateControllerExtension:
+    # applies the adaptive per-host limits of the rate controller (export/throttle.py) to the scrapy downloader:
+    # every download slot (one per host) gets the concurrency and delay the controller learned for its host,
+    # and the latency and status of every response are reported back to it
+
+    def __init__(self, crawler, controller):
+        self.crawler = crawler
+        self.controller = controller
+        self.downloaded = set() # requests that got a response, the others that leave the downloader failed (timeout, connection error ...)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        controller = get_controller(load_config())
+
+        if controller is None:
+            raise NotConfigured
+
+        s = cls(crawler, controller)
+        crawler.signals.connect(s.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(s.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(s.request_left_downloader, signal=signals.request_left_downloader)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def get_slot(self, request):
+        key = request.meta.get("download_slot")
+
+        if key is None:
+            return None
+
+        return self.crawler.engine.downloader.slots.get(key)
+
+    def apply(self, request):
+        slot = self.get_slot(request)
+
+        if slot is None:
+            return
+
+        host = get_host(request.url)
+        slot.concurrency = self.controller.get_limit(host)
+        slot.delay = self.controller.get_delay(host)
+
+    def request_reached_downloader(self, request, spider):
+        # the slot of the host exists once the request reached the downloader
+        self.apply(request)
+
+    def response_downloaded(self, response, request, spider):
+        self.downloaded.add(id(request))
+        self.controller.record(get_host(request.url), request.meta.get("download_latency"), response.status)
+        self.apply(request)
+
+    def request_left_downloader(self, request, spider):
+        if id(request) in self.downloaded:
+            self.downloaded.discard(id(request))
+            return
+
+        self.controller.record(get_host(request.url), None, None)
+        self.apply(request)
+
+    def spider_closed(self, spider):
+        self.controller.save()
@@ -3,7 +3,10 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os, json, hashlib
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -57,15 +60,29 @@ class ProvatoSpiderMiddleware:
 
 
 class ProvatoDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # conditional fetching of the station pages (requests with a 'station' in their meta):
+    # - the ETag / Last-Modified of every page are sent back (If-None-Match / If-Modified-Since), a '304 Not Modified' is not parsed
+    # - a page with the same content (hash) as the last time is not parsed
+    # - a page with the same observation time ('get_observation_time' of the spider) as the last time is not parsed
+    # the skipped pages are counted in the 'conditional_fetch/*' stats ('conditional_fetch/no_new_observation' is the total)
+    # the new state of a page is only kept once the spider scraped an item from it ('item_scraped'), a page that failed to parse is parsed again next time
+    # the state of every url is kept in CONDITIONAL_FETCH_STATE between runs, shared by all the spiders:
+    # a closing spider only writes the urls it changed, over the latest file, so spiders running at the same time keep each other's state
+
+    def __init__(self, stats, path, enabled = True):
+        self.stats = stats
+        self.path = path
+        self.enabled = enabled
+        self.state = {} # url -> {'etag', 'last_modified', 'hash', 'observation'}
+        self.changed = set() # urls whose state changed since the spider opened
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler.stats, crawler.settings.get("CONDITIONAL_FETCH_STATE"), crawler.settings.getbool("CONDITIONAL_FETCH_ENABLED", True))
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
         return s
 
     def process_request(self, request, spider):
@@ -78,6 +95,20 @@ class ProvatoDownloaderMiddleware:
         # - or return a Request object
         # - or raise IgnoreRequest: process_exception() methods of
         #   installed downloader middleware will be called
+        if not self.enabled or "station" not in request.meta:
+            return None
+
+        state = self.state.get(request.url)
+
+        if state is None:
+            return None
+
+        if state.get("etag") and b"If-None-Match" not in request.headers:
+            request.headers[b"If-None-Match"] = state["etag"]
+
+        if state.get("last_modified") and b"If-Modified-Since" not in request.headers:
+            request.headers[b"If-Modified-Since"] = state["last_modified"]
+
         return None
 
     def process_response(self, request, response, spider):
@@ -87,8 +118,62 @@ class ProvatoDownloaderMiddleware:
         # - return a Response object
         # - return a Request object
         # - or raise IgnoreRequest
+        if not self.enabled or "station" not in request.meta:
+            return response
+
+        if response.status == 304:
+            self.skip("not_modified", request)
+
+        if response.status != 200:
+            return response
+
+        state = dict(self.state.get(request.url, {}))
+
+        for key, header in (("etag", b"ETag"), ("last_modified", b"Last-Modified")):
+            value = response.headers.get(header)
+
+            if value is not None:
+                state[key] = value.decode("latin-1")
+
+        content_hash = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+
+        if content_hash == state.get("hash"):
+            self.commit(request.url, state)
+            self.skip("unchanged_content", request)
+
+        state["hash"] = content_hash
+
+        get_observation_time = getattr(spider, "get_observation_time", None)
+
+        if get_observation_time is not None:
+            observation = get_observation_time(response)
+
+            if observation is not None and observation == state.get("observation"):
+                self.commit(request.url, state)
+                self.skip("unchanged_observation", request)
+
+            state["observation"] = observation
+
+        request.meta["conditional_fetch_state"] = state
+
         return response
 
+    def item_scraped(self, item, response, spider):
+        request = getattr(response, "request", None)
+
+        if request is not None and "conditional_fetch_state" in request.meta:
+            self.commit(request.url, request.meta["conditional_fetch_state"])
+
+    def commit(self, url, state):
+        self.state[url] = state
+        self.changed.add(url)
+
+    def skip(self, reason, request):
+        self.stats.inc_value(f"conditional_fetch/{reason}")
+        self.stats.inc_value("conditional_fetch/no_new_observation")
+
+        raise IgnoreRequest(f"No new observation ({reason}): {request.url}")
+
     def process_exception(self, request, exception, spider):
         # Called when a download handler or a process_request()
         # (from other downloader middleware) raises an exception.
@@ -101,3 +186,41 @@ class ProvatoDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as state_file:
+                self.state = json.load(state_file)
+        except (OSError, ValueError) as e:
+            print(f"Conditional fetch state could not be loaded, fetching everything: {e}")
+
+    def spider_closed(self, spider):
+        if not self.enabled or not self.path or not self.changed:
+            return
+
+        state = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as state_file:
+                    state = json.load(state_file)
+            except (OSError, ValueError):
+                state = {}
+
+        for url in self.changed:
+            state[url] = self.state[url]
+
+        self.changed.clear()
+
+        directory = os.path.dirname(self.path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # a temporary file per process, the spiders of other processes may close at the same time
+        with open(f"{self.path}.{os.getpid()}.tmp", "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, ensure_ascii=False, indent=2)
+
+        os.replace(f"{self.path}.{os.getpid()}.tmp", self.path)
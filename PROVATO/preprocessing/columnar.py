@@ -0,0 +1,185 @@
+import numpy as np
+
+from export.timestamps import convert as convert_timedata
+
+from .derived import get_metric
+from .preprocessing import check_header, FARM_NUMBERS, DIRECTION_TO_DEGREES
+from .units import get_unit_parser, ROUNDED_MEASUREMENTS, ROUNDED_CONVERSIONS
+
+# batch mode of the preprocessing ('preprocessing_mode: batch' in the config)
+# instead of cleaning the staging file row by row with the 'clean_*' functions, it is loaded into one NumPy array per column
+# units are split from the values and converted with array operations, heat index and wind chill are calculated over whole columns (see preprocessing/derived.py)
+# and the cleaned and failed rows are selected with boolean masks
+
+REQUIRED_MEASUREMENTS = ['temperature', 'humidity', 'wind', 'direction', 'yetos', 'barometer'] # must be numbers
+
+def to_float(values):
+    # converts an array of strings to floats, empty or non-numeric strings become nan
+    values = np.where(np.char.strip(values) == '', 'nan', values)
+
+    try:
+        return values.astype(float)
+    except ValueError:
+        return np.array([parse_float(value) for value in values], dtype = float)
+
+def parse_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def split_values(cells, measurement, parser):
+    # splits the unit from every value of the column and converts the values to the unit of 'results_units', with the conversion table of the unit parser
+    # values that can't be converted become nan
+    cells = np.char.strip(np.char.lower(cells))
+    values = cells.copy()
+
+    scale = np.ones(len(cells))
+    offset = np.zeros(len(cells))
+    matched = np.zeros(len(cells), dtype = bool)
+
+    for unit in parser.get_units(measurement):
+        mask = ~matched & np.char.endswith(cells, unit)
+
+        if not mask.any():
+            continue
+
+        values[mask] = np.char.strip(np.char.replace(cells[mask], unit, ''))
+        scale[mask], offset[mask] = parser.get_conversion(measurement, unit)
+        matched |= mask
+
+    if parser.get_conversion(measurement, '') is None:
+        values[~matched] = '' # without a result unit only values with a known unit can be converted
+
+    result = to_float(values) * scale + offset
+
+    if measurement in ROUNDED_MEASUREMENTS:
+        result = np.round(result, ROUNDED_MEASUREMENTS[measurement])
+    elif measurement in ROUNDED_CONVERSIONS:
+        converted = (scale != 1) | (offset != 0)
+        result[converted] = np.round(result[converted], ROUNDED_CONVERSIONS[measurement])
+
+    return result
+
+def clean_direction(cells, wind):
+    cells = np.char.strip(np.char.replace(cells, '°', ''))
+
+    degrees = to_float(cells)
+    compass = np.array([DIRECTION_TO_DEGREES.get(cell, np.nan) for cell in cells], dtype = float)
+
+    named = np.isnan(degrees)
+    degrees[named] = compass[named]
+
+    # a direction without a number is -1 when there is no wind
+    degrees[named & (np.trunc(wind) == 0)] = -1
+
+    return degrees
+
+def clean_heat_index(cells, temperature, humidity, config):
+    heat = split_values(cells, 'heat_index', get_unit_parser(config))
+
+    valid = ~np.isnan(heat) & ~np.isnan(temperature) & ~np.isnan(humidity) & (heat != temperature)
+    result = np.full(len(cells), np.nan)
+
+    if valid.any():
+        result[valid] = get_metric('heat_index', config)(temperature[valid], humidity[valid])
+
+    return result
+
+def clean_wind_chill(cells, temperature, wind, config):
+    wind_chill = split_values(cells, 'wind_chill', get_unit_parser(config))
+
+    valid = ~np.isnan(wind_chill) & ~np.isnan(temperature) & ~np.isnan(wind) & (wind_chill != temperature)
+    result = np.full(len(cells), np.nan)
+
+    if valid.any():
+        result[valid] = get_metric('wind_chill', config)(temperature[valid], wind[valid])
+
+    return result
+
+def clean_basic_data(columns, source, config):
+    # returns the cleaned basic columns and the mask of the rows whose basic data are invalid
+    failed = np.zeros(len(columns['farm']), dtype = bool)
+    cleaned = {}
+
+    farm = np.char.strip(columns['farm'])
+    farm_number = to_float(np.char.replace(farm, 'farm', ''))
+    farm_valid = np.char.startswith(farm, 'farm') & (farm_number >= 0) & (farm_number <= len(config['farms']))
+
+    cleaned['farm'] = np.array([FARM_NUMBERS.get(int(number), int(number)) if valid else None for number, valid in zip(farm_number, farm_valid)], dtype = object)
+    failed |= ~farm_valid
+
+    timedata = []
+
+    for cell in columns['timedata']:
+        try:
+            timedata.append(convert_timedata(cell, source))
+        except Exception:
+            timedata.append(None)
+
+    cleaned['timedata'] = np.array(timedata, dtype = object)
+    failed |= cleaned['timedata'] == None
+
+    station_number = to_float(columns['station_number'])
+    cleaned['station_number'] = np.array([int(number) if not np.isnan(number) else None for number in station_number], dtype = object)
+    failed |= np.isnan(station_number)
+
+    for name in ['source', 'crawled', 'city', 'nomos']:
+        cleaned[name] = columns[name]
+        failed |= np.char.strip(columns[name]) == ''
+
+    return cleaned, failed
+
+def clean_columns(rows, source, config, dedup_index):
+    # cleans all the rows of a staging file at once, returns (cleaned rows, failed rows)
+    # failed rows are returned as they were found in the staging file, in the order of the staging file
+    header = check_header(None, config)
+
+    valid_length = [row for row in rows if len(row) == len(header)]
+
+    if not valid_length:
+        return [], [list(row) for row in rows]
+
+    table = np.array(valid_length, dtype = str)
+    columns = {name: table[:, index] for index, name in enumerate(header)}
+
+    cleaned, failed = clean_basic_data(columns, source, config)
+
+    for measurement in ['temperature', 'humidity', 'wind', 'yetos', 'barometer', 'dew_point', 'solar_radiation']:
+        cleaned[measurement] = split_values(columns[measurement], measurement, get_unit_parser(config))
+
+    cleaned['direction'] = clean_direction(columns['direction'], cleaned['wind'])
+    cleaned['heat_index'] = clean_heat_index(columns['heat_index'], cleaned['temperature'], cleaned['humidity'], config)
+    cleaned['wind_chill'] = clean_wind_chill(columns['wind_chill'], cleaned['temperature'], cleaned['wind'], config)
+
+    # optional measurements (dew_point, solar_radiation, heat_index, wind_chill) are None when they can't be converted
+    for measurement in REQUIRED_MEASUREMENTS:
+        failed |= np.isnan(cleaned[measurement])
+
+    # duplicates are checked in order, so a timestamp repeated inside the staging file is only kept once
+    for index in np.flatnonzero(~failed):
+        if dedup_index.contains(cleaned['station_number'][index], cleaned['timedata'][index]) is True:
+            failed[index] = True
+            continue
+
+        dedup_index.add(cleaned['station_number'][index], cleaned['timedata'][index])
+
+    output = []
+
+    for name in header:
+        column = cleaned[name]
+
+        if column.dtype == float:
+            column = np.where(np.isnan(column), None, column.astype(object))
+
+        if name == 'direction':
+            column = np.where(column == -1, -1, column) # no wind: -1 as in the row mode, not -1.0
+
+        output.append(column[~failed].tolist())
+
+    cleaned_rows = [list(row) for row in zip(*output)]
+
+    failed_valid = iter(failed.tolist())
+    failed_rows = [list(row) for row in rows if len(row) != len(header) or next(failed_valid)]
+
+    return cleaned_rows, failed_rows
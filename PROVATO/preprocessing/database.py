@@ -0,0 +1,148 @@
+from dotenv import load_dotenv
+load_dotenv() # load environment variables
+
+import csv, io, os, psycopg2
+
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+
+# bulk loader of the cleaned rows into 'meteo_data'
+# every batch is one transaction: the rows are streamed with COPY into a temporary table,
+# then one INSERT ... SELECT joins them with meteo_farms/meteo_stations/farms_api (farm + station_number -> station)
+# the insert skips the rows that are already in 'meteo_data' (same station, source and timedata), so loading a batch again changes nothing
+# the batches of all loaders are serialized by a transaction-level advisory lock, so two loaders at the same time can't insert the same row twice
+# a failed batch raises, so the preprocessing does not commit the rows and loads them again next time
+
+STAGING_TABLE = 'meteo_data_staging'
+LOCK_KEY = 'meteo_data_loader' # key of the advisory lock, hashed by postgres into the lock id
+
+# postgres types of the basic columns in the temporary table, every measurement is a double precision
+BASIC_TYPES = {
+    'farm': 'integer',
+    'source': 'text',
+    'timedata': 'timestamp',
+    'crawled': 'timestamptz',
+    'city': 'text',
+    'nomos': 'text',
+    'station_number': 'integer',
+}
+
+class DatabaseLoader:
+    def __init__(self, config, pool, batch_size = 5000):
+        self._columns = list(config.columns)
+        self._measurements = list(config.measurements)
+        self._pool = pool
+        self._batch_size = batch_size
+
+        self._create = sql.SQL("CREATE TEMPORARY TABLE IF NOT EXISTS {} ({}) ON COMMIT DELETE ROWS").format(
+            sql.Identifier(STAGING_TABLE),
+            sql.SQL(', ').join(
+                sql.SQL('{} {}').format(sql.Identifier(column), sql.SQL(BASIC_TYPES.get(column, 'double precision')))
+                for column in self._columns
+            ),
+        )
+
+        self._copy = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(STAGING_TABLE),
+            sql.SQL(', ').join(sql.Identifier(column) for column in self._columns),
+        )
+
+        self._insert = sql.SQL("""
+            INSERT INTO meteo_data (station, source, timedata, crawled, {measurements})
+            SELECT DISTINCT ON (meteo_farms.station, staging.source, staging.timedata)
+                meteo_farms.station, staging.source, staging.timedata, staging.crawled, {staging_measurements}
+            FROM {staging} AS staging
+            JOIN meteo_farms ON meteo_farms.farm = staging.farm AND meteo_farms.station = staging.station_number
+            JOIN meteo_stations ON meteo_stations.id = meteo_farms.station
+            JOIN farms_api ON farms_api.id_api = meteo_farms.farm
+            WHERE NOT EXISTS (
+                SELECT 1 FROM meteo_data
+                WHERE meteo_data.station = meteo_farms.station
+                    AND meteo_data.source = staging.source
+                    AND meteo_data.timedata = staging.timedata
+            )
+        """).format(
+            measurements = sql.SQL(', ').join(sql.Identifier(measurement) for measurement in self._measurements),
+            staging_measurements = sql.SQL(', ').join(sql.Identifier('staging', measurement) for measurement in self._measurements),
+            staging = sql.Identifier(STAGING_TABLE),
+        )
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    def get_buffer(self, rows):
+        # the rows as csv for COPY, None is written as an empty field, which COPY reads as NULL
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        return buffer
+
+    def load_batch(self, connection, rows):
+        # one transaction: committed when the block ends, rolled back if anything fails
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL TIME ZONE 'Europe/Athens'") # timestamps without offset are Athens local time
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (LOCK_KEY,)) # released when the transaction ends
+                cursor.execute(self._create)
+                cursor.copy_expert(self._copy, self.get_buffer(rows))
+                cursor.execute(self._insert)
+
+                return cursor.rowcount
+
+    def load(self, rows):
+        # rows: cleaned rows (lists in the order of the config columns), returns the number of rows inserted into 'meteo_data'
+        # an error is raised again after the batches already committed, they are skipped when the rows are loaded again
+        if not rows:
+            return 0
+
+        inserted = 0
+        connection = self._pool.getconn()
+
+        try:
+            for start in range(0, len(rows), self._batch_size):
+                inserted += self.load_batch(connection, rows[start:start + self._batch_size])
+        except psycopg2.Error as e:
+            print(e.pgcode, e.pgerror)
+            raise
+        finally:
+            # a broken connection (server restarted ...) is closed instead of going back to the pool
+            self._pool.putconn(connection, close = connection.closed != 0)
+
+        print(f"Loaded {inserted} of {len(rows)} rows into meteo_data")
+
+        return inserted
+
+_loaders = {} # process id -> DatabaseLoader
+
+def get_loader(config):
+    # the loader of the 'database' config section, None when it is disabled
+    # a database that can't be reached raises, so the preprocessing keeps the rows for the next run
+    # the pool is opened once per process (the preprocessing workers are separate processes), and reused by every cycle of the daemon
+    settings = config.get('database')
+
+    if settings is None or settings.get('enabled') is not True:
+        return None
+
+    loader = _loaders.get(os.getpid())
+
+    if loader is None:
+        try:
+            pool = ThreadedConnectionPool(
+                settings['pool_min'],
+                settings['pool_max'],
+                host = os.getenv("PG_HOST"),
+                port = os.getenv("PG_PORT"),
+                dbname = os.getenv("PG_DB"),
+                user = os.getenv("PG_USER"),
+                password = os.getenv("PG_PASS")
+            )
+        except psycopg2.Error as e:
+            print(e)
+            raise
+
+        loader = DatabaseLoader(config, pool, settings['batch_size'])
+        _loaders[os.getpid()] = loader
+
+    return loader
@@ -0,0 +1,73 @@
+import os
+
+from array import array
+from datetime import datetime, timedelta
+
+from zoneinfo import ZoneInfo
+
+from export.timestamps import to_epoch
+
+class DedupIndex:
+    # index of the (station_number, timedata) pairs already cleaned for one source (one index file per source, see 'dedup' in the 'preprocessing' config section)
+    # it is loaded once per preprocessing run into a set, so checking a row is O(1) instead of a scan of the previous run
+    # on disk it is stored as a flat array of 64-bit integers: station_number, timedata (epoch seconds), station_number, timedata, ...
+    def __init__(self, path, retention_days = 7):
+        self._path = path
+        self._retention = timedelta(days = retention_days)
+        self._keys = set()
+
+        self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get_epoch(self, timedata):
+        # timedata is the cleaned timestamp ('%Y-%m-%d %H:%M:%S.%f', Athens local time)
+        return to_epoch(timedata)
+
+    def contains(self, station_number, timedata):
+        return (int(station_number), self.get_epoch(timedata)) in self._keys
+
+    def add(self, station_number, timedata):
+        self._keys.add((int(station_number), self.get_epoch(timedata)))
+
+    def load(self):
+        if not os.path.exists(self._path):
+            return
+
+        data = array('q')
+
+        with open(self._path, 'rb') as index_file:
+            data.frombytes(index_file.read())
+
+        self._keys = set(zip(data[0::2], data[1::2]))
+
+    def prune(self, now):
+        # keeps only the keys of the last 'retention_days' days, so the index does not grow forever
+        oldest = int((now - self._retention).timestamp())
+
+        self._keys = {key for key in self._keys if key[1] >= oldest}
+
+    def save(self, now = None):
+        self.prune(now or datetime.now(ZoneInfo("Europe/Athens")))
+
+        data = array('q')
+
+        for station_number, epoch in self._keys:
+            data.append(station_number)
+            data.append(epoch)
+
+        directory = os.path.dirname(self._path)
+
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+
+        # written next to the index and then renamed, so a crash never leaves a half-written index behind
+        with open(f'{self._path}.tmp', 'wb') as index_file:
+            data.tofile(index_file)
+
+        os.replace(f'{self._path}.tmp', self._path)
@@ -0,0 +1,116 @@
+import numpy as np
+
+# derived metrics (heat index, wind chill, dew point) calculated with NumPy over whole arrays in one call
+# they use the same formulas and the same undefined-value masking as metpy, but without building pint quantities for every value
+# inputs: temperature in °C, humidity in %, wind speed in km/h, outputs in °C
+# undefined values (e.g. heat index below 80 °F, where metpy returns a masked value) are returned as nan
+
+def celsius_to_fahrenheit(temperature):
+    return temperature * 1.8 + 32
+
+def fahrenheit_to_celsius(temperature):
+    return (temperature - 32) / 1.8
+
+def heat_index(temperature, humidity):
+    # Rothfusz regression with the NWS adjustments, as in metpy.calc.heat_index
+    temperature = celsius_to_fahrenheit(np.atleast_1d(np.asarray(temperature, dtype = float)))
+    humidity = np.atleast_1d(np.asarray(humidity, dtype = float)) / 100
+
+    temperature, humidity = np.broadcast_arrays(temperature, humidity)
+
+    temperature2 = temperature ** 2
+    humidity2 = humidity ** 2
+
+    simple = -10.3 + 1.1 * temperature + 4.7 * humidity
+    full = (-42.379
+            + 2.04901523 * temperature
+            + 1014.333127 * humidity
+            - 22.475541 * temperature * humidity
+            - 6.83783e-3 * temperature2
+            - 5.481717e2 * humidity2
+            + 1.22874e-1 * temperature2 * humidity
+            + 8.5282 * temperature * humidity2
+            - 1.99e-2 * temperature2 * humidity2)
+
+    result = np.where(temperature <= 40, temperature, np.where(simple < 79, simple, full))
+
+    with np.errstate(invalid = 'ignore'):
+        dry = (humidity <= 0.13) & (temperature >= 80) & (temperature <= 112)
+        result = np.where(dry, result - (13 - humidity * 100) / 4 * np.sqrt((17 - np.abs(temperature - 95)) / 17), result)
+
+    humid = (humidity > 0.85) & (temperature >= 80) & (temperature <= 87)
+    result = np.where(humid, result + 0.02 * (humidity * 100 - 85) * (87 - temperature), result)
+
+    result = np.where(temperature < 80, np.nan, result) # undefined below 80 °F
+
+    return fahrenheit_to_celsius(result)
+
+def wind_chill(temperature, wind):
+    # wind chill temperature index, as in metpy.calc.windchill
+    temperature = np.atleast_1d(np.asarray(temperature, dtype = float))
+    wind = np.atleast_1d(np.asarray(wind, dtype = float))
+
+    with np.errstate(invalid = 'ignore'):
+        speed_factor = wind ** 0.16
+
+    result = (0.6215 + 0.3965 * speed_factor) * temperature - 11.37 * speed_factor + 13.12
+
+    return np.where((temperature > 10) | (wind <= 4.828032), np.nan, result) # undefined above 10 °C or at 3 mph and below
+
+def dew_point(temperature, humidity):
+    # saturation vapor pressure over liquid water (Ambaum 2020, as in metpy.calc.saturation_vapor_pressure), then the inverse Bolton formula of metpy.calc.dewpoint
+    temperature = np.atleast_1d(np.asarray(temperature, dtype = float)) + 273.15
+    humidity = np.atleast_1d(np.asarray(humidity, dtype = float)) / 100
+
+    cp_l, cp_v, rv, lv, t0 = 4219.4, 1860.078011865639, 461.52311572606084, 2500840.0, 273.16
+
+    latent_heat = lv - (cp_l - cp_v) * (temperature - t0)
+    saturation = 611.2 * (t0 / temperature) ** ((cp_l - cp_v) / rv) * np.exp((lv / t0 - latent_heat / temperature) / rv)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        value = np.log(humidity * saturation / 611.2)
+
+        return 243.5 * value / (17.67 - value) # nan without humidity
+
+def metpy_heat_index(temperature, humidity):
+    from metpy.calc import heat_index as implement_heat_index
+    from metpy.units import units
+
+    calc = implement_heat_index(np.atleast_1d(temperature) * units.degC, np.atleast_1d(humidity) * units.percent)
+
+    return np.ma.filled(np.ma.asarray(calc.to('degC').magnitude, dtype = float), np.nan)
+
+def metpy_wind_chill(temperature, wind):
+    from metpy.calc import windchill as implement_windchill
+    from metpy.units import units
+
+    calc = implement_windchill(np.atleast_1d(temperature) * units.degC, np.atleast_1d(wind) * units.kph)
+
+    return np.ma.filled(np.ma.asarray(calc.to('degC').magnitude, dtype = float), np.nan)
+
+def metpy_dew_point(temperature, humidity):
+    from metpy.calc import dewpoint_from_relative_humidity
+    from metpy.units import units
+
+    calc = dewpoint_from_relative_humidity(np.atleast_1d(temperature) * units.degC, np.atleast_1d(humidity) * units.percent)
+
+    return np.ma.filled(np.ma.asarray(calc.to('degC').magnitude, dtype = float), np.nan)
+
+METRICS = {
+    'heat_index': heat_index,
+    'wind_chill': wind_chill,
+    'dew_point': dew_point,
+}
+
+METPY_METRICS = {
+    'heat_index': metpy_heat_index,
+    'wind_chill': metpy_wind_chill,
+    'dew_point': metpy_dew_point,
+}
+
+def get_metric(name, config):
+    # 'derived_metrics: metpy' in the config calculates the metrics with metpy instead (metpy is only imported then)
+    if config.get('derived_metrics') == 'metpy':
+        return METPY_METRICS[name]
+
+    return METRICS[name]
@@ -0,0 +1,205 @@
+import os, io, csv, glob, json, time
+
+# the staging file of a source as an append-only journal
+# the collectors only ever append to the staging file (the active segment), the preprocessing never truncates or rewrites it:
+# - it remembers how many bytes of every segment it already consumed (<staging>.offsets) and only reads the new complete lines
+# - once the active segment is bigger than 'max_bytes', it is renamed into a numbered segment (<staging>.000001, ...),
+#   the next collector starts a new staging file, and a collector still writing to the renamed one (its file stays open) loses nothing,
+#   because a rotated segment is read like the active one until it is fully consumed and has not been written for 'seal_after' seconds, then it is deleted
+# so collectors and preprocessing can run at the same time without losing rows
+# the offsets are kept per inode, which does not change when a segment is renamed
+# the byte ranges read by a run (the batch) are saved before anything is written, with the outputs that already took the batch:
+# a run that fails before 'commit' is replayed with exactly the same rows, and only into the outputs that did not take them yet
+
+class StagingJournal:
+    def __init__(self, path, header, max_bytes = 1048576, seal_after = 600):
+        self._path = path
+        self._header = list(header)
+        self._header_names = set(header)
+        self._max_bytes = max_bytes
+        self._seal_after = seal_after
+
+        self._offsets_path = f'{path}.offsets'
+        self._offsets = {} # inode -> bytes consumed
+        self._batch = None # {'ranges': [[inode, start, end], ...], 'done': [output, ...]} of the rows read and not committed yet
+
+        self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def get_segments(self):
+        # the rotated segments, oldest first, then the active segment
+        segments = sorted(path for path in glob.glob(f'{glob.escape(self._path)}.*') if path[len(self._path) + 1:].isdigit())
+
+        if os.path.exists(self._path):
+            segments.append(self._path)
+
+        return segments
+
+    def get_offset(self, status):
+        offset = self._offsets.get(str(status.st_ino), 0)
+
+        # a smaller file than the offset is a new file that got the inode of a deleted segment
+        return offset if offset <= status.st_size else 0
+
+    def read_range(self, segment, start, end = None):
+        # (inode, start, end of the complete lines, data), None when the segment is gone
+        try:
+            with open(segment, 'rb') as segment_file:
+                status = os.fstat(segment_file.fileno())
+                start = self.get_offset(status) if start is None else start
+
+                segment_file.seek(start)
+                data = segment_file.read() if end is None else segment_file.read(end - start)
+        except FileNotFoundError:
+            return None
+
+        if end is None:
+            end = start + data.rfind(b'\n') + 1
+
+        return str(status.st_ino), start, end, data[:end - start]
+
+    def is_header(self, row):
+        # the header of the config columns, or of older columns (the first staging files had no 'station_number')
+        return row[0] == self._header[0] and set(row) <= self._header_names
+
+    def parse(self, data):
+        return [row for row in csv.reader(io.StringIO(data.decode('utf-8'), newline = '')) if row and not self.is_header(row)]
+
+    def read(self):
+        # the rows appended since the last commit, in the order they were written, without the header lines
+        # only complete lines are read, a line that a collector is still writing is read by the next run
+        # the rows of a batch that was read but never committed are read again, exactly the same bytes
+        rows = []
+
+        if self._batch is not None:
+            segments = {}
+
+            for segment in self.get_segments():
+                try:
+                    segments[str(os.stat(segment).st_ino)] = segment
+                except OSError:
+                    continue
+
+            for inode, start, end in self._batch['ranges']:
+                found = self.read_range(segments[inode], start, end) if inode in segments else None
+
+                if found is None:
+                    print(f"Staging segment of an uncommitted batch is missing, its rows are lost: {self._path} ({inode})")
+                    continue
+
+                rows.extend(self.parse(found[3]))
+
+            return rows
+
+        ranges = []
+
+        for segment in self.get_segments():
+            found = self.read_range(segment, None)
+
+            if found is None or found[2] == found[1]:
+                continue
+
+            ranges.append(list(found[:3]))
+            rows.extend(self.parse(found[3]))
+
+        if ranges:
+            self._batch = {'ranges': ranges, 'done': []}
+            self.save()
+
+        return rows
+
+    def is_done(self, output):
+        # True when the output already took the rows of the current batch
+        return self._batch is not None and output in self._batch['done']
+
+    def done(self, output):
+        if self._batch is not None and output not in self._batch['done']:
+            self._batch['done'].append(output)
+            self.save()
+
+    def commit(self):
+        # the rows returned by 'read' are processed: their bytes are not read again
+        if self._batch is not None:
+            self._offsets.update({inode: end for inode, start, end in self._batch['ranges']})
+            self._batch = None
+
+        self.rotate()
+        self.seal()
+        self.save()
+
+    def rotate(self):
+        try:
+            if not os.path.exists(self._path) or os.path.getsize(self._path) < self._max_bytes:
+                return
+
+            numbers = [int(segment[len(self._path) + 1:]) for segment in self.get_segments() if segment != self._path]
+            os.rename(self._path, f'{self._path}.{max(numbers, default = 0) + 1:06d}')
+        except OSError as e:
+            print(e)
+
+    def seal(self):
+        # deletes the rotated segments that are fully consumed and no longer written
+        for segment in self.get_segments():
+            if segment == self._path:
+                continue
+
+            try:
+                status = os.stat(segment)
+
+                if self.get_offset(status) < status.st_size or time.time() - status.st_mtime < self._seal_after:
+                    continue
+
+                os.remove(segment)
+                self._offsets.pop(str(status.st_ino), None)
+            except OSError as e:
+                print(e)
+
+    def load(self):
+        if not os.path.exists(self._offsets_path):
+            return
+
+        try:
+            with open(self._offsets_path, 'r', encoding = 'utf-8') as offsets_file:
+                state = json.load(offsets_file)
+
+            # {'offsets': ..., 'batch': ...}, the first files only had the offsets
+            self._offsets = state.get('offsets', {}) if 'offsets' in state or 'batch' in state else state
+            self._batch = state.get('batch')
+        except (OSError, ValueError) as e:
+            print(f"Staging offsets could not be loaded, reading the staging segments from the start: {e}")
+
+    def save(self):
+        # only the inodes of existing segments are kept
+        existing = set()
+
+        for segment in self.get_segments():
+            try:
+                existing.add(str(os.stat(segment).st_ino))
+            except OSError:
+                continue
+
+        self._offsets = {inode: offset for inode, offset in self._offsets.items() if inode in existing}
+
+        directory = os.path.dirname(self._offsets_path)
+
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+
+        with open(f'{self._offsets_path}.tmp', 'w', encoding = 'utf-8') as offsets_file:
+            json.dump({'offsets': self._offsets, 'batch': self._batch}, offsets_file, indent = 2, sort_keys = True)
+
+        os.replace(f'{self._offsets_path}.tmp', self._offsets_path)
+
+def get_journal(config, key):
+    # the journal of the staging file of a source (key of the 'preprocessing' section)
+    settings = config.get('staging_journal', {})
+
+    return StagingJournal(
+        config['preprocessing'][key]['staging'],
+        config.columns,
+        max_bytes = settings.get('max_bytes', 1048576),
+        seal_after = settings.get('seal_after', 600),
+    )
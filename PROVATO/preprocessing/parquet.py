@@ -0,0 +1,239 @@
+import os, glob, json
+
+from datetime import datetime
+
+from export.config import load_config
+from export.timestamps import ATHENS
+
+try:
+    import pyarrow as pa, pyarrow.parquet as pq, pyarrow.dataset as ds
+except ImportError:
+    pa = pq = ds = None
+
+# typed, columnar copy of the rows of the preprocessing, next to the daily csv files (optional, needs pyarrow)
+# every kind of rows ('cleaned', 'failed', 'raw') is partitioned by source (key of the 'preprocessing' section) and date: <path>/<kind>/source_key=<key>/date=<YYYY-MM-DD>/
+# - every cycle adds one small 'part-*.parquet' file to the partitions it touched, 'compact' merges the parts of a finished day into 'data.parquet'
+# - cleaned rows have float measurements and timestamp columns and are partitioned by the date of their observation ('timedata'),
+#   failed and raw rows keep the text of the staging file and are partitioned by the date they were preprocessed
+# - farm, source, city and nomos are dictionary encoded, and every row group keeps min/max statistics,
+#   so a scan ('scan') only reads the partitions, row groups and columns it needs
+
+KINDS = ('cleaned', 'failed', 'raw')
+DICTIONARY_COLUMNS = ('farm', 'source', 'city', 'nomos')
+TIMESTAMP_COLUMNS = ('timedata', 'crawled')
+INTEGER_COLUMNS = ('farm', 'station_number')
+
+def get_partitioning():
+    return ds.partitioning(pa.schema([('source_key', pa.string()), ('date', pa.string())]), flavor = 'hive')
+
+def to_timestamp(value):
+    if value is None or value == '':
+        return None
+
+    try:
+        timestamp = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+    return timestamp.replace(tzinfo = ATHENS) if timestamp.tzinfo is None else timestamp
+
+def to_float(value):
+    try:
+        return None if value is None or value == '' else float(value)
+    except (ValueError, TypeError):
+        return None
+
+def to_integer(value):
+    try:
+        return None if value is None or value == '' else int(value)
+    except (ValueError, TypeError):
+        return None
+
+def to_text(value):
+    return None if value is None else str(value)
+
+class ParquetSink:
+    def __init__(self, config, path, row_group_size = 65536, compression = 'zstd'):
+        self._columns = list(config.columns)
+        self._path = path
+        self._row_group_size = row_group_size
+        self._compression = compression
+
+        self._schemas = {
+            'cleaned': pa.schema([(column, self.get_type(column, True)) for column in self._columns]),
+            'text': pa.schema([(column, self.get_type(column, False)) for column in self._columns]),
+        }
+
+    @property
+    def path(self):
+        return self._path
+
+    def get_type(self, column, typed):
+        # typed: the types of the cleaned rows, otherwise the text of the staging file
+        if typed and column in INTEGER_COLUMNS:
+            return pa.int32()
+
+        if column in DICTIONARY_COLUMNS:
+            return pa.dictionary(pa.int32(), pa.string())
+
+        if not typed:
+            return pa.string()
+
+        if column in TIMESTAMP_COLUMNS:
+            return pa.timestamp('us', tz = 'Europe/Athens')
+
+        return pa.float64()
+
+    def get_schema(self, kind):
+        return self._schemas['cleaned' if kind == 'cleaned' else 'text']
+
+    def build_table(self, kind, rows):
+        # rows are lists in the order of the config columns, converted column by column into the arrow types of the kind
+        schema = self.get_schema(kind)
+        arrays = []
+
+        for index, field in enumerate(schema):
+            values = [row[index] if index < len(row) else None for row in rows]
+
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array([to_text(value) for value in values], type = pa.string()).dictionary_encode())
+            elif pa.types.is_timestamp(field.type):
+                arrays.append(pa.array([to_timestamp(value) for value in values], type = field.type))
+            elif pa.types.is_integer(field.type):
+                arrays.append(pa.array([to_integer(value) for value in values], type = field.type))
+            elif pa.types.is_floating(field.type):
+                arrays.append(pa.array([to_float(value) for value in values], type = field.type))
+            else:
+                arrays.append(pa.array([to_text(value) for value in values], type = field.type))
+
+        return pa.Table.from_arrays(arrays, schema = schema)
+
+    def get_partition(self, kind, source, date):
+        return os.path.join(self._path, kind, f'source_key={source}', f'date={date}')
+
+    def write_file(self, table, directory, name):
+        # written under a hidden name first (ignored by the scans) and renamed once complete
+        os.makedirs(directory, exist_ok = True)
+        temporary = os.path.join(directory, f'.{name}.tmp')
+
+        pq.write_table(table, temporary, row_group_size = self._row_group_size, compression = self._compression, write_statistics = True)
+        os.replace(temporary, os.path.join(directory, name))
+
+    def write(self, source, kind, rows, now):
+        # one new part file per partition touched by the rows
+        if not rows:
+            return
+
+        name = f'part-{now.strftime("%H%M%S%f")}-{os.getpid()}.parquet'
+        table = self.build_table(kind, rows)
+
+        if kind == 'cleaned' and 'timedata' in self._columns:
+            dates = [timestamp.strftime('%Y-%m-%d') if timestamp is not None else now.strftime('%Y-%m-%d') for timestamp in table.column('timedata').to_pylist()]
+        else:
+            dates = [now.strftime('%Y-%m-%d')] * len(rows)
+
+        for date in sorted(set(dates)):
+            mask = pa.array([row_date == date for row_date in dates])
+            self.write_file(table.filter(mask), self.get_partition(kind, source, date), name)
+
+    def compact_partition(self, directory):
+        # merges the part files of a partition (and its previous 'data.parquet') into 'data.parquet', sorted by station and time
+        # the names of the merged parts are kept in the metadata of the file, so parts left behind by an interrupted compaction are not merged twice
+        data_path = os.path.join(directory, 'data.parquet')
+        parts = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+        merged = set()
+        tables = []
+
+        if os.path.exists(data_path):
+            table = pq.read_table(data_path)
+            metadata = table.schema.metadata or {}
+            merged = set(json.loads(metadata.get(b'compacted', b'[]')))
+            tables.append(table.replace_schema_metadata(None))
+
+        new_parts = [part for part in parts if os.path.basename(part) not in merged]
+
+        if new_parts:
+            tables.extend(pq.read_table(part) for part in new_parts)
+
+            table = pa.concat_tables(tables, promote_options = 'permissive').unify_dictionaries()
+            sort_keys = [(column, 'ascending') for column in ('station_number', 'timedata') if column in table.column_names]
+
+            if sort_keys:
+                table = table.sort_by(sort_keys)
+
+            table = table.replace_schema_metadata({'compacted': json.dumps(sorted(os.path.basename(part) for part in parts))})
+            self.write_file(table, directory, 'data.parquet')
+
+        for part in parts:
+            os.remove(part)
+
+        return len(new_parts)
+
+    def compact(self, before = None):
+        # compacts every partition of a day before 'before' (default: today), the partitions of today still get new parts
+        before = before or datetime.now(ATHENS).strftime('%Y-%m-%d')
+        compacted = 0
+
+        for directory in sorted(glob.glob(os.path.join(self._path, '*', 'source_key=*', 'date=*'))):
+            if os.path.basename(directory)[len('date='):] >= before:
+                continue
+
+            try:
+                compacted += self.compact_partition(directory)
+            except (OSError, pa.ArrowException) as e:
+                print(f"Parquet partition could not be compacted: {directory} -> {e}")
+
+        return compacted
+
+    def scan(self, kind = 'cleaned', source = None, start = None, end = None, columns = None, condition = None):
+        # pyarrow Table of the rows of a kind, only the partitions of the source and dates, and only the columns asked for, are read
+        # source: key of the 'preprocessing' section, start/end: dates ('YYYY-MM-DD') of the partitions, inclusive, condition: an extra pyarrow.dataset expression (ds.field('station_number') == 7 ...)
+        path = os.path.join(self._path, kind)
+
+        if not os.path.isdir(path):
+            return self.get_schema(kind).empty_table()
+
+        dataset = ds.dataset(path, format = 'parquet', partitioning = get_partitioning())
+        expression = condition
+
+        for partition in (
+            ds.field('source_key') == source if source is not None else None,
+            ds.field('date') >= start if start is not None else None,
+            ds.field('date') <= end if end is not None else None,
+        ):
+            if partition is not None:
+                expression = partition if expression is None else expression & partition
+
+        return dataset.to_table(columns = columns, filter = expression)
+
+_sinks = {} # path -> ParquetSink
+
+def get_sink(config):
+    # the sink of the 'parquet' config section, None when it is disabled or pyarrow is not installed
+    settings = config.get('parquet')
+
+    if settings is None or settings.get('enabled') is not True:
+        return None
+
+    if pa is None:
+        print("Parquet output is enabled but pyarrow is not installed (pip install pyarrow), skipping...")
+        return None
+
+    sink = _sinks.get(settings['path'])
+
+    if sink is None:
+        sink = ParquetSink(config, settings['path'], settings['row_group_size'], settings['compression'])
+        _sinks[settings['path']] = sink
+
+    return sink
+
+def compact_partitions():
+    sink = get_sink(load_config())
+
+    if sink is None:
+        return
+
+    print(f"Compacted {sink.compact()} parquet files")
+
+if __name__ == '__main__':
+    compact_partitions()
@@ -1,37 +1,81 @@
 from dotenv import load_dotenv
 load_dotenv() # load environment variables
 
-import csv, yaml, os, logging, time, numpy as np, psycopg2
+import csv, os, logging, time, multiprocessing, numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 
-from metpy.calc import heat_index as implement_heat_index, windchill as implement_windchill
-from metpy.units import units
-
 from zoneinfo import ZoneInfo
 
-def process_row(row, source, config, last_data_path):
+from export.config import load_config
+from export.timestamps import convert as convert_timedata
+
+from .database import get_loader
+from .dedup import DedupIndex
+from .derived import get_metric
+from .journal import get_journal
+from .parquet import get_sink
+from .rows import get_row_type
+from .store import get_local_store
+from .units import get_unit_parser
+
+# farm number in the config -> farm id in the database
+FARM_NUMBERS = {
+    1: 1,
+    2: 4,
+    3: 2,
+    4: 6,
+}
+
+# measurements every cleaned row needs, and measurements that may be missing ('check_cleaned_row')
+REQUIRED_MEASUREMENTS = ('temperature', 'humidity', 'wind', 'direction', 'yetos', 'barometer')
+OPTIONAL_MEASUREMENTS = ('heat_index', 'wind_chill', 'solar_radiation', 'dew_point')
+
+DIRECTION_TO_DEGREES = {
+    'N': 0.0,
+    'NNE': 22.5,
+    'NE': 45.0,
+    'ENE': 67.5,
+    'E': 90.0,
+    'ESE': 112.5,
+    'SE': 135.0,
+    'SSE': 157.5,
+    'S': 180.0,
+    'SSW': 202.5,
+    'SW': 225.0,
+    'WSW': 247.5,
+    'W': 270.0,
+    'WNW': 292.5,
+    'NW': 315.0,
+    'NNW': 337.5,
+}
+
+def process_row(row, source, config, dedup_index):
+    # the staging row (list of strings) becomes one Row (see preprocessing/rows.py), cleaned in place column by column
     if check_row_length(row, config) is True:
         # logging.error(f"Line 17: Error with row length")/
         return row, {'error': 'check row length'}
 
-    row[0], farm_status = clean_farm(row[0], config)
-    row[1], source_status = clean_source(row[1])
-    row[2], timedata__status = clean_timedata(row[2], source, last_data_path)
-    row[3], crawled_status = clean_crawled(row[3])
-    row[4], city_status = clean_city(row[4])
-    row[5], nomos_status = clean_nomos(row[5])
-    row[6] = {'station_number': int(row[6])}
-
-    row[7] = clean_temperature(row[7], config)
-    row[8] = clean_humidity(row[8], config)
-    row[9] = clean_wind_speed(row[9], config)
-    row[10] = clean_wind_direction(row[10], row[9]['wind'])
-    row[11] = clean_yetos(row[11], config)
-    row[12] = clean_barometer(row[12], config)
-    row[13] = clean_dew_point(row[13], config)
-    row[14] = clean_heat_index(row[14], row[7]['temperature'], row[8]['humidity'], config)
-    row[15] = clean_wind_chill(row[15], row[7]['temperature'], row[9]['wind'], config)
-    row[16] = clean_solar_radiation(row[16], config)
+    row = get_row_type(config.columns)(row)
+
+    row.farm, farm_status = clean_farm(row.farm, config)
+    row.source, source_status = clean_source(row.source)
+    row.station_number = int(row.station_number)
+    row.timedata, timedata__status = clean_timedata(row.timedata, source, row.station_number, dedup_index)
+    row.crawled, crawled_status = clean_crawled(row.crawled)
+    row.city, city_status = clean_city(row.city)
+    row.nomos, nomos_status = clean_nomos(row.nomos)
+
+    row.temperature = clean_temperature(row.temperature, config)
+    row.humidity = clean_humidity(row.humidity, config)
+    row.wind = clean_wind_speed(row.wind, config)
+    row.direction = clean_wind_direction(row.direction, row.wind)
+    row.yetos = clean_yetos(row.yetos, config)
+    row.barometer = clean_barometer(row.barometer, config)
+    row.dew_point = clean_dew_point(row.dew_point, config)
+    row.heat_index = clean_heat_index(row.heat_index, row.temperature, row.humidity, config)
+    row.wind_chill = clean_wind_chill(row.wind_chill, row.temperature, row.wind, config)
+    row.solar_radiation = clean_solar_radiation(row.solar_radiation, config)
 
     print(row)
     
@@ -45,416 +89,186 @@ def process_row(row, source, config, last_data_path):
     return row, {'success': 'ok'}
 
 def check_row_length(row, config):
-    return True if len(row) != (len(config['weather_live_basic_data']) + len(config['weather_live_conditions_measurements'])) else False
+    return True if len(row) != len(config.columns) else False
 
 def clean_farm(farm, config):
     try:
         if not 'farm' in farm:
-            return {'farm': farm}, False
+            return farm, False
 
         cleaned_farm = farm.split('farm')
 
         if cleaned_farm is None or not len(cleaned_farm) == 2 or not 0 <= int(cleaned_farm[1]) <= len(config['farms']):
-            return {'farm': farm}, False
+            return farm, False
         
         int_farm = int(cleaned_farm[1])
-        
-        if int_farm == 1:
-            int_farm = 1
-        elif int_farm == 2:
-            int_farm = 4
-        elif int_farm == 3:
-            int_farm = 2
-        elif int_farm == 4:
-            int_farm = 6
-
-        return {'farm': int(int_farm)}, True
+        int_farm = FARM_NUMBERS.get(int_farm, int_farm)
+
+        return int(int_farm), True
     except Exception as e:
         print(e)
-        return {'farm': farm}, False
+        return farm, False
 
 def clean_source(source):
     if source is None or not source:
-        return {'source': source}, False
+        return source, False
     
-    return {'source': source}, True
+    return source, True
 
-def clean_timedata(timedata, source, last_data_path):
+def clean_timedata(timedata, source, station_number, dedup_index):
     try:
         if timedata is None or source is None:
-            return {'timedata': timedata}, False
-
-        cleaned = None
-        athens = ZoneInfo("Europe/Athens")
-
-        if source == 'open-meteo':
-            dt = datetime.fromtimestamp(int(timedata), tz=ZoneInfo("UTC"))
-            cleaned = dt.astimezone(athens).strftime("%Y-%m-%d %H:%M:%S.%f")
-            return {"timedata": cleaned}, True
-
-        elif source == 'wu':
-            timedata = timedata.replace("EEST", "").strip()
-            dt = datetime.strptime(timedata, "%I:%M %p on %B %d, %Y")
-            cleaned = dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+            return timedata, False
 
-        elif source == 'meteo':
-            dt = datetime.strptime(timedata, "%d/%m/%Y %H:%M")
-            cleaned = dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+        cleaned = convert_timedata(timedata, source)
 
-        elif source == 'soda':
-            dt = datetime.strptime(timedata, "%Y-%m-%d %H:%M:%S")
-            cleaned = dt.strftime("%Y-%m-%d %H:%M:%S.%f")
-        
         if cleaned is None:
-            return {'timedata': timedata}, False
+            return timedata, False
         
-        with open(last_data_path, 'r', encoding = 'utf-8', newline = '') as last_data_file:
-            last_data_reader = csv.reader(last_data_file)
-            next(last_data_reader, None)
-
-            for row in last_data_reader:
-                if str(row[0]) == str(cleaned):
-                    return {'timedata': cleaned}, False
-                
-        return {'timedata': cleaned}, True
+        if dedup_index.contains(station_number, cleaned) is True:
+            return cleaned, False
+
+        return cleaned, True
     except Exception as e:
         # logging.error(f"Error with time converter ({source}): {timedata} -> {e}")
-        return {'timedata': timedata}, False
+        return timedata, False
 
 def clean_crawled(crawled):
     if crawled is None or not crawled:
-        return {'crawled': crawled}, False
+        return crawled, False
 
-    return {'crawled': crawled}, True
+    return crawled, True
 
 def clean_city(city):
     if city is None or not city:
-        return {'city': city}, False
+        return city, False
 
-    return {'city': city}, True
+    return city, True
 
 def clean_nomos(nomos):
     if nomos is None or not nomos:
-        return {'nomos': nomos}, False
+        return nomos, False
 
-    return {'nomos': nomos}, True
+    return nomos, True
 
 def clean_temperature(temperature, config):
-    try:
-        units = get_units('temperature', config)
-
-        if temperature is None or units is None:
-            return {'temperature': temperature}
-
-        temperature, units = set_lower_and_strip(temperature, units)
-
-        if 'f' in temperature and units == 'c':
-            temperature = temperature.replace('f', '').strip()
+    # every measurement is converted by the unit parser of the config (see preprocessing/units.py)
+    # a value that can't be converted is kept as it is, so the row fails in 'check_cleaned_row'
+    cleaned = get_unit_parser(config).convert('temperature', temperature)
 
-            if check_value(temperature) is True:
-                temperature = round((float(temperature) - 32) / 1.8, 1)
-        elif 'c' in temperature and units == 'c':
-            temperature = temperature.replace('°c', '').strip()
-
-        return {'temperature': float(temperature)}
-    except Exception as e:
-        # logging.error(f"Temperature cleaning failed: 'temperature': {temperature} | 'units': {units} -> {e}")
-        print('aaa', e)
-        return {'temperature': temperature}
+    return temperature if cleaned is None else cleaned
 
 def clean_humidity(humidity, config):
-    try:
-        units = get_units('humidity', config)
+    cleaned = get_unit_parser(config).convert('humidity', humidity)
 
-        if humidity is None or units is None:
-            return {'humidity': humidity}
-
-        humidity, units = set_lower_and_strip(humidity, units)
-
-        if '%' in humidity and units == '%':
-            humidity = humidity.replace('%', '').strip()
-
-        return {'humidity': float(humidity)}
-    except Exception as e:
-        # logging.error(f"Humidity cleaning failed: 'humidity': {temperature} | 'units': {units} -> {e}")
-        print('2', e)
-        return {'humidity': humidity}
+    return humidity if cleaned is None else cleaned
 
 def clean_wind_speed(wind, config):
-    try:
-        units = get_units('wind', config)
-        
-        if wind is None or units is None:
-            return {'wind': wind}
-
-        wind_new, units = set_lower_and_strip(wind, units)
-
-        if units == 'km/h':
-            if 'km/h' in wind_new:
-                wind_new = wind_new.replace('km/h', '').strip()
-            elif 'mph' in wind_new:
-                wind_new = wind_new.replace('mph', '').strip()
+    cleaned = get_unit_parser(config).convert('wind', wind)
 
-                if check_value(wind_new) is True:
-                    wind_new = float(wind_new) * 1.60934  # mph → km/h
-            elif 'm/s' in wind_new:
-                wind_new = wind_new.replace('m/s', '').strip()
-
-                if check_value(wind_new) is True:
-                    wind_new = float(wind_new) * 3.6      # m/s → km/h
-
-        if check_value(wind_new) is False:
-            return {'wind': wind}
-
-        return {'wind': round(float(wind_new), 1)}
-    except Exception as e:
-        print('3', e)
-        return {'wind': wind}
+    return wind if cleaned is None else cleaned
 
 def clean_wind_direction(direction, wind_speed):
     try:
         if direction is None:
-            return {'direction': direction}
+            return direction
 
         if '°' in direction:
             direction = direction.replace('°', '').strip()
-            return {'direction': float(direction)}
+            return float(direction)
         
         if check_value(direction) is True:
-            return {'direction': float(direction)}
+            return float(direction)
         
         if check_value(direction) is False:
             if int(wind_speed) == 0.0:
-                return {'direction': -1}
-
-        DIRECTION_TO_DEGREES = {
-            'N': 0.0,
-            'NNE': 22.5,
-            'NE': 45.0,
-            'ENE': 67.5,
-            'E': 90.0,
-            'ESE': 112.5,
-            'SE': 135.0,
-            'SSE': 157.5,
-            'S': 180.0,
-            'SSW': 202.5,
-            'SW': 225.0,
-            'WSW': 247.5,
-            'W': 270.0,
-            'WNW': 292.5,
-            'NW': 315.0,
-            'NNW': 337.5,
-        }
+                return -1
 
         match = DIRECTION_TO_DEGREES.get(direction)
 
         if match is None:
-            return {'direction': direction}
+            return direction
 
-        return {'direction': float(match)}
+        return float(match)
     except Exception as e:
         print('4', e)
-        return {'direction': direction}
+        return direction
 
 def clean_yetos(yetos, config):
-    try:
-        units = get_units('yetos', config)
-        
-        if yetos is None or units is None:
-            return {'yetos': yetos}
-
-        yetos_new, units = set_lower_and_strip(yetos, units)
-
-        if units == 'mm':
-            if 'mm' in yetos_new:
-                yetos_new = yetos_new.replace('mm', '').strip()
-            elif 'cm' in yetos_new:
-                yetos_new = yetos_new.replace('cm', '').strip()
-                
-                if check_value(yetos_new) is True:
-                    yetos_new = float(yetos_new) * 10  # 1 cm = 10 mm
-            elif 'inches' in yetos_new:
-                yetos_new = yetos_new.replace('inches', '').strip()
-                
-                if check_value(yetos_new) is True:
-                    yetos_new = float(yetos_new) * 25.4  # 1 inch = 25.4 mm
-            elif 'inch' in yetos_new:
-                yetos_new = yetos_new.replace('inch', '').strip()
-                
-                if check_value(yetos_new) is True:
-                    yetos_new = float(yetos_new) * 25.4
-            elif 'in' in yetos_new:
-                yetos_new = yetos_new.replace('in', '').strip()
-                
-                if check_value(yetos_new) is True:
-                    yetos_new = float(yetos_new) * 25.4
-
-            return {'yetos': 0.0}
-
-        if check_value(yetos_new) is False:
-            return {'yetos': yetos}
-
-        return {'yetos': round(float(yetos_new), 1)}
-    except Exception as e:
-        print('5', e)
-        return {'yetos': yetos}
-
-def clean_barometer(barometer, config):
-    try:
-        units = get_units('barometer', config)
-        
-        if barometer is None or units is None:
-            return {'barometer': barometer}
-
-        barometer_new, units = set_lower_and_strip(barometer, units)
-
-        if units == 'hpa':
-            if 'hpa' in barometer_new:
-                barometer_new = barometer_new.replace('hpa', '').strip()
-            elif 'mb' in barometer_new:
-                barometer_new = barometer_new.replace('mb', '').strip()
-            elif 'mmhg' in barometer_new:
-                barometer_new = barometer_new.replace('mmhg', '').strip()
-                
-                if check_value(barometer_new) is True:
-                    barometer_new = float(barometer_new) * 1.33322
-            elif 'inhg' in barometer_new:
-                barometer_new = barometer_new.replace('inhg', '').strip()
-
-                if check_value(barometer_new) is True:
-                    barometer_new = float(barometer_new) * 33.8639
-            elif 'in' in barometer_new:
-                barometer_new = barometer_new.replace('in', '').strip()
-
-                if check_value(barometer_new) is True:
-                    barometer_new = float(barometer_new) * 33.8639
-
-        if check_value(barometer_new) is False:
-            return {'barometer': barometer}
-
-        return {'barometer': round(float(barometer_new), 1)}
-    except Exception as e:
-        # logging.error(f"ERROR (preprocessing): clean barometer failed.")
-        print('6', e)
-        return {'barometer': barometer}
-
-def clean_dew_point(dew_point, config):
-    try:
-        if dew_point is None or not dew_point:
-            return {'dew_point': None}
+    cleaned = get_unit_parser(config).convert('yetos', yetos)
 
-        units = get_units('dew_point', config)
-        dew_point_new, units = set_lower_and_strip(dew_point, units)
+    return yetos if cleaned is None else cleaned
 
-        if 'f' in dew_point_new and units == 'c':
-            dew_point_new = dew_point_new.replace('f', '').strip()
+def clean_barometer(barometer, config):
+    cleaned = get_unit_parser(config).convert('barometer', barometer)
 
-            if check_value(dew_point_new) is True:
-                dew_point_new = round((float(dew_point_new) - 32) / 1.8, 1)
-        elif 'c' in dew_point_new and units == 'c':
-            dew_point_new = dew_point_new.replace('°c', '').strip()
+    return barometer if cleaned is None else cleaned
 
-        if check_value(dew_point_new) is False:
-            return {'dew_point': 0.0}
+def clean_dew_point(dew_point, config):
+    # optional measurement, None when it is missing or can't be converted
+    if dew_point is None or not dew_point:
+        return None
 
-        return {'dew_point': float(dew_point_new)}
-    except Exception as e:
-        # logging.error(f"ERROR (preprocessing): clean barometer failed.")
-        print('7', e)
-        return {'dew_point': dew_point}
+    return get_unit_parser(config).convert('dew_point', dew_point)
 
 def clean_heat_index(heat, temperature, humidity, config):
     try:
         if heat is None or not heat:
-            return {'heat_index': None}
-        
-        units_local = get_units('heat_index', config)
-        heat, units_local = set_lower_and_strip(heat, units_local)
+            return None
 
-        if 'c' in heat and units_local == 'c':
-            heat = heat.replace('°c', '').strip()
+        heat = get_unit_parser(config).convert('heat_index', heat)
 
-            if check_value(temperature) is False or check_value(humidity) is False:
-                return {'heat_index': None}
+        if heat is None or check_value(temperature) is False or check_value(humidity) is False:
+            return None
 
-            if check_value(heat) is True and float(heat) == float(temperature):
-                return {'heat_index': None}
+        if heat == float(temperature):
+            return None
 
-            temp = float(temperature) * units.degC
-            hum = float(humidity) * units.percent
+        calc = get_metric('heat_index', config)(float(temperature), float(humidity))[0]
 
-            new = implement_heat_index(temp, hum)
-            calc = new.to('degC').magnitude.squeeze()
+        if not np.isnan(calc):
+            return float(calc)
 
-            if np.ma.is_masked(calc) is False:
-                return {'heat_index': calc}
-
-        return {'heat_index': None}
+        return None
     except Exception as e:
         # logging.error(f"ERROR (preprocessing):.")
         print('8', e)
-        return {'heat': heat}
-    
+        return None
+
 def clean_wind_chill(wind_chill, temperature, wind_speed, config):
     try:
         if wind_chill is None or not wind_chill:
-            return {'wind_chill': None}
-        
-        units_local = get_units('wind_chill', config)
-        wind_chill, units_local = set_lower_and_strip(wind_chill, units_local)
-
-        if 'c' in wind_chill and units_local == 'c':
-            wind_chill = wind_chill.replace('°c', '').strip()
+            return None
 
-            if check_value(wind_chill) is False or check_value(temperature) is False or check_value(wind_speed) is False:
-                return {'wind_chill': wind_chill}
+        wind_chill = get_unit_parser(config).convert('wind_chill', wind_chill)
 
-            if check_value(wind_chill) is True and float(wind_chill) == float(temperature):
-                return {'wind_chill': None}
+        if wind_chill is None or check_value(temperature) is False or check_value(wind_speed) is False:
+            return None
 
-            temp = float(temperature) * units.degC
-            wind_sp = float(wind_speed) * units.kph
+        if wind_chill == float(temperature):
+            return None
 
-            new = implement_windchill(temp, wind_sp)
-            calc = new.to('degC').m
+        calc = get_metric('wind_chill', config)(float(temperature), float(wind_speed))[0]
 
-            if np.ma.is_masked(calc) is False:
-                return {'wind_chill': calc}
+        if not np.isnan(calc):
+            return float(calc)
 
-        return {'wind_chill': None}
+        return None
     except Exception as e:
         # logging.error(f"ERROR (preprocessing):.")
         print('9', e)
-        return {'wind_chill': wind_chill}
+        return None
 
 def clean_solar_radiation(solar_radiation, config):
-    try:
-        if solar_radiation is None or not solar_radiation:
-            return {'solar_radiation': None}
-
-        units = get_units('solar_radiation', config)
-        solar_radiation_new, units = set_lower_and_strip(solar_radiation, units)
+    # optional measurement, None when it is missing or can't be converted
+    if solar_radiation is None or not solar_radiation:
+        return None
 
-        if 'w/m²' in solar_radiation_new and 'w/m²' in units:
-            solar_radiation_new = solar_radiation_new.replace('w/m²', '').strip()
-        elif 'w/m^2' in solar_radiation_new and 'w/m^2' in units:
-            solar_radiation_new = solar_radiation_new.replace('w/m^2', '').strip()
-
-        return {'solar_radiation': solar_radiation_new}
-    except Exception as e:
-        # logging.error(f"ERROR (preprocessing):.")
-        print('10', e)
-        return {'solar_radiation': solar_radiation}
+    return get_unit_parser(config).convert('solar_radiation', solar_radiation)
 
 def check_header(header, config):
     try:
-        items = []
-
-        for item in config['weather_live_basic_data']:
-            items.append(item)
-
-        for item in config['weather_live_conditions_measurements']:
-            items.append(item)
+        items = list(config.columns)
 
         if header is None or not header == items:
             return items
@@ -490,123 +304,113 @@ def generate_path(path, now, status):
         print(e)
         return False, None
 
-def set_lower_and_strip(item, unit):
-    return item.lower().strip(), unit.lower().strip()
+def write_csv(path, now, rows, config):
+    # appends the rows to the daily csv file of the path, with the header when the file is new
+    is_new, path = generate_path(path, now, 1)
+
+    with open(path, 'a', encoding = 'utf-8', newline = '') as output_file:
+        writer = csv.writer(output_file)
+
+        if is_new is True:
+            writer.writerow(check_header(None, config))
+
+        writer.writerows(rows)
+
+def clean_rows(rows, key, config, dedup_index):
+    # (cleaned rows, failed rows) of the staging rows, as lists in the order of the config columns
+    if config.get('preprocessing_mode') == 'batch':
+        # the whole staging file is cleaned at once, column by column (see preprocessing/columnar.py)
+        from .columnar import clean_columns
+
+        return clean_columns(rows, key, config, dedup_index)
+
+    # failed rows are written as they were found in the staging file, like the batch mode
+    cleaned_rows, failed_rows = [], []
+
+    for row in rows:
+        cleaned_row, status = process_row(row, key, config, dedup_index)
+
+        if next(iter(status)) == 'error':
+            failed_rows.append(list(row))
+        elif next(iter(status)) == 'success':
+            cleaned_rows.append(cleaned_row.values())
+            dedup_index.add(cleaned_row.station_number, cleaned_row.timedata)
 
-def get_units(item, config):
-    return config['results_units'][item]
+    return cleaned_rows, failed_rows
 
-def load_config():
-    with open(os.getenv('CONFIG'), 'r') as conf:
-        return yaml.safe_load(conf)
+def write_output(journal, name, write):
+    # every output takes the rows of a batch once: a run that failed after some outputs replays the batch only into the others
+    if journal.is_done(name):
+        return
 
-def sql_val(v):
-    return 'NULL' if v is None else v
+    write()
+    journal.done(name)
 
-def init_preprocessing():
+def preprocess_source(key):
+    # cleans the staging file of one source (key of the 'preprocessing' section)
+    # sources share no files, so they can be cleaned at the same time in different processes
+    # only the rows appended to the staging file since the last run are read (see preprocessing/journal.py), the collectors may keep appending meanwhile
     try:
         config = load_config()
+        value = config['preprocessing'][key]
 
-        # connection = psycopg2.connect(
-        #     host = os.getenv("PG_HOST"),
-        #     port = os.getenv("PG_PORT"),
-        #     dbname = os.getenv("PG_DB"),
-        #     user = os.getenv("PG_USER"),
-        #     password = os.getenv("PG_PASS")
-        # )
-
-        # cursor = connection.cursor()
-
-        # if connection.closed == 0:
-        #     print("ok")
-        # else:
-        #     print("rip")
-
-        for key, value in config['preprocessing'].items():
-            last_data_path = value['last_data']
-            raw_path = value['raw']
-            staging_path = value['staging']
-            cleaned_path = value['cleaned']
-            failed_path = value['failed']
-
-            with open(staging_path, 'r', encoding = 'utf-8', newline = '') as staging_file:
-                reader = csv.reader(staging_file)
-                header = check_header(next(reader, None), config)
-
-                now = datetime.now(ZoneInfo("Europe/Athens"))
-
-                check_cleaned, cleaned_path = generate_path(cleaned_path, now, 1)
-                check_failed, failed_path = generate_path(failed_path, now, 1)
-                check_raw, raw_path = generate_path(raw_path, now, 1)
-                    
-                timedata_table = []
-
-                with open(failed_path, 'a', encoding = 'utf-8', newline = '') as failed_file, \
-                    open(cleaned_path, 'a', encoding = 'utf-8', newline = '') as cleaned_file, \
-                    open(raw_path, 'a', encoding = 'utf-8', newline = '') as raw_file:
-
-                    if check_cleaned is True:
-                        csv.writer(cleaned_file).writerow(check_header(None, config))
-
-                    if check_failed is True:
-                        csv.writer(failed_file).writerow(check_header(None, config))
-                            
-                    if check_raw is True:
-                        csv.writer(raw_file).writerow(check_header(None, config))
-
-                    for row in reader:
-                        csv.writer(raw_file).writerow(row)
-
-                        cleaned_row, status = process_row(row, key, config, last_data_path)
-
-                        if next(iter(status)) == 'error':
-                            csv.writer(failed_file).writerow([list(item.values())[0] for item in row])
-                        elif next(iter(status)) == 'success':
-                            csv.writer(cleaned_file).writerow([list(item.values())[0] for item in cleaned_row])
-
-                        timedata_table.append(cleaned_row[2]['timedata'])
-
-                        # time.sleep(5)
-
-                        # try:
-                        #     cursor.execute(f"INSERT INTO meteo_data (station, source, timedata, crawled, temperature, humidity, wind, direction, yetos, barometer, dew_point, heat_index, wind_chill, solar_radiation) \
-                        #                             SELECT meteo_farms.station, \
-                        #                                 '{cleaned_row[1]['source']}', \
-                        #                                 '{cleaned_row[2]['timedata']}', \
-                        #                                 '{cleaned_row[3]['crawled']}', \
-                        #                                 {sql_val(cleaned_row[7]['temperature'])}, \
-                        #                                 {sql_val(cleaned_row[8]['humidity'])}, \
-                        #                                 {sql_val(cleaned_row[9]['wind'])}, \
-                        #                                 {sql_val(cleaned_row[10]['direction'])}, \
-                        #                                 {sql_val(cleaned_row[11]['yetos'])}, \
-                        #                                 {sql_val(cleaned_row[12]['barometer'])}, \
-                        #                                 {sql_val(cleaned_row[13]['dew_point'])}, \
-                        #                                 {sql_val(cleaned_row[14]['heat_index'])}, \
-                        #                                 {sql_val(cleaned_row[15]['wind_chill'])}, \
-                        #                                 {sql_val(cleaned_row[16]['solar_radiation'])} \
-                        #                             FROM meteo_farms, meteo_stations, farms_api \
-                        #                             WHERE meteo_farms.station = meteo_stations.id \
-                        #                                 AND meteo_farms.farm = farms_api.id_api \
-                        #                                 AND meteo_farms.farm = {cleaned_row[0]['farm']} \
-                        #                                 AND meteo_farms.station = {cleaned_row[6]['station_number']};")
-                        #     connection.commit()
-                        # except psycopg2.Error as e:
-                        #     print(e.pgcode, e.pgerror)
-                        #     cursor.close()
-                        #     connection.close()
-
-                generate_path(last_data_path, now, 3)
-                with open(last_data_path, 'w', encoding = 'utf-8', newline = '') as last_data_file:
-                    writer = csv.writer(last_data_file)
-                    writer.writerow(['timedata'])                    
-                    writer.writerows([[item] for item in timedata_table])
-
-            with open(staging_path, 'w', encoding = 'utf-8', newline = '') as staging:
-                csv.writer(staging).writerow(header)
-
-        # cursor.close()
-        # connection.close()
+        dedup_index = DedupIndex(value['dedup'], config['dedup_retention_days'])
+        journal = get_journal(config, key)
 
+        rows = journal.read()
+
+        if rows:
+            now = datetime.now(ZoneInfo("Europe/Athens"))
+
+            # the dedup index is only saved once every output took the batch,
+            # so a replayed batch is cleaned against the same index and gives the same rows
+            cleaned_rows, failed_rows = clean_rows(rows, key, config, dedup_index)
+
+            write_output(journal, 'raw', lambda: write_csv(value['raw'], now, rows, config))
+            write_output(journal, 'cleaned', lambda: write_csv(value['cleaned'], now, cleaned_rows, config))
+            write_output(journal, 'failed', lambda: write_csv(value['failed'], now, failed_rows, config))
+
+            sink = get_sink(config) # typed Parquet copy of the rows (see preprocessing/parquet.py), None when it is disabled
+
+            if sink is not None:
+                write_output(journal, 'parquet/raw', lambda: sink.write(key, 'raw', rows, now))
+                write_output(journal, 'parquet/cleaned', lambda: sink.write(key, 'cleaned', cleaned_rows, now))
+                write_output(journal, 'parquet/failed', lambda: sink.write(key, 'failed', failed_rows, now))
+
+            loader = get_loader(config) # bulk loader of the cleaned rows into 'meteo_data' (see preprocessing/database.py), None when it is disabled
+
+            if loader is not None:
+                write_output(journal, 'database', lambda: loader.load(cleaned_rows))
+
+            store = get_local_store(config) # embedded SQLite store of the cleaned rows (see preprocessing/store.py), None when it is disabled
+
+            if store is not None:
+                write_output(journal, 'store', lambda: store.insert(cleaned_rows))
+
+            dedup_index.save(now)
+
+        # the rows read are committed only once they are written everywhere, a failed run reads them again
+        journal.commit()
+    except Exception as e:
+        print(e)
+
+def init_preprocessing(sources = None, workers = None):
+    # sources: keys of the 'preprocessing' section to clean (e.g. ['meteo', 'wu']), None cleans all of them
+    # workers: number of processes cleaning sources at the same time, None uses 'preprocessing_workers' of the config (1 cleans them one after the other)
+    try:
+        config = load_config()
+        keys = [key for key in config['preprocessing'] if sources is None or key in sources]
+        workers = workers or config.get('preprocessing_workers', 1)
+
+        if workers <= 1 or len(keys) <= 1:
+            for key in keys:
+                preprocess_source(key)
+
+            return
+
+        # 'spawn' starts clean processes, so this is also safe from the threads of run/daemon.py
+        with ProcessPoolExecutor(max_workers = min(workers, len(keys)), mp_context = multiprocessing.get_context('spawn')) as executor:
+            list(executor.map(preprocess_source, keys))
     except Exception as e:
         print(e)
 
@@ -624,14 +428,16 @@ def check_cleaned_row(cleaned_row):
     # if 'null' in v or None in v or '' in v:
     #     return False
 
-    for row in cleaned_row:
-        for k, v in row.items():
-            if k == 'temperature' or k == 'humidity' or k == 'wind' or k == 'direction' or k == 'yetos' or k == 'barometer':
-                if check_value(v) is False:
-                    return False
-            elif k == 'heat_index' or k == 'wind_chill' or k == 'solar_radiation' or k == 'dew_point':
-                if check_value(v) is False and v is not None:
-                    return False
+    for name in REQUIRED_MEASUREMENTS:
+        if name in cleaned_row.columns and check_value(getattr(cleaned_row, name)) is False:
+            return False
+
+    for name in OPTIONAL_MEASUREMENTS:
+        if name in cleaned_row.columns:
+            value = getattr(cleaned_row, name)
+
+            if check_value(value) is False and value is not None:
+                return False
 
     # for unit in [
     #                 '°C', 'C', '°F', 'F',
@@ -650,4 +456,6 @@ def check_cleaned_row(cleaned_row):
 
     return True
 
-init_preprocessing()
+if __name__ == '__main__':
+    init_preprocessing()
+
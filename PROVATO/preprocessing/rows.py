@@ -0,0 +1,46 @@
+from operator import attrgetter
+
+# compact row of the cleaning step: one object per staging row, with one slot per column of the config ('weather_live_basic_data' + measurements)
+# the cleaning functions read and replace the values by name ('row.temperature'), and the writers get them back in column order ('row.values()')
+
+class Row:
+    __slots__ = ()
+
+    columns = ()
+    get_values = None
+
+    def __init__(self, values):
+        for column, value in zip(self.columns, values):
+            setattr(self, column, value)
+
+    def values(self):
+        return list(self.get_values(self))
+
+    def __repr__(self):
+        return f'Row({self.values()})'
+
+_row_types = {} # columns -> Row class
+
+def get_row_type(columns):
+    # the Row class of the columns, built once per process
+    columns = tuple(columns)
+    row_type = _row_types.get(columns)
+
+    if row_type is None:
+        invalid = [column for column in columns if not column.isidentifier() or hasattr(Row, column)]
+
+        if invalid:
+            raise ValueError(f"Invalid column names for a row: {invalid}")
+
+        row_type = type('Row', (Row,), {
+            '__slots__': columns,
+            'columns': columns,
+            'get_values': staticmethod(attrgetter(*columns)) if len(columns) > 1 else staticmethod(lambda row: (getattr(row, columns[0]),)),
+        })
+        _row_types[columns] = row_type
+
+    return row_type
+
+def get_values(row):
+    # the values of a row in column order, a row that could not be built (wrong length) is the list read from the staging file
+    return row.values() if isinstance(row, Row) else list(row)
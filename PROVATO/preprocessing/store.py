@@ -0,0 +1,183 @@
+import os, sqlite3, threading, numpy as np
+
+from datetime import datetime, timedelta
+
+from export.timestamps import ATHENS
+
+# embedded store of the cleaned rows (SQLite in WAL mode), for fast local lookups without Postgres
+# one table 'observations' with the config columns ('weather_live_basic_data' + measurements),
+# indexed by (station_number, timedata) for the time ranges of a station and by (farm, timedata) for the latest reading per farm
+# timedata is stored as in the cleaned files ('2025-07-29 01:00:00.000000', Athens local time), so text order is time order
+# the same observation (station, time, source) is stored once, loading rows again changes nothing
+
+TABLE = 'observations'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# sqlite types of the basic columns, every measurement is a REAL
+BASIC_TYPES = {
+    'farm': 'INTEGER',
+    'source': 'TEXT',
+    'timedata': 'TEXT',
+    'crawled': 'TEXT',
+    'city': 'TEXT',
+    'nomos': 'TEXT',
+    'station_number': 'INTEGER',
+}
+
+def to_timedata(value):
+    # datetime (naive: Athens local time) or string -> stored timedata
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(ATHENS).replace(tzinfo = None)
+
+        return value.strftime(TIME_FORMAT)
+
+    return value
+
+class LocalStore:
+    def __init__(self, config, path, batch_size = 5000):
+        self._columns = list(config.columns)
+        self._path = path
+        self._batch_size = batch_size
+
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+
+        # one connection shared by the threads of the daemon, the preprocessing workers of other processes wait for the lock of the file
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout = 30, check_same_thread = False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+
+        self.create()
+
+        placeholders = ', '.join('?' for _ in self._columns)
+        self._insert = f'INSERT OR IGNORE INTO {TABLE} ({", ".join(self._columns)}) VALUES ({placeholders})'
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def create(self):
+        columns = ', '.join(f'{column} {BASIC_TYPES.get(column, "REAL")}' for column in self._columns)
+
+        with self._lock, self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} ({columns})')
+            self._connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {TABLE}_station_time ON {TABLE} (station_number, timedata, source)')
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_farm_time ON {TABLE} (farm, timedata)')
+
+    def close(self):
+        self._connection.close()
+
+    def insert(self, rows):
+        # rows: cleaned rows (lists in the order of the config columns), one transaction per batch
+        # returns the number of rows stored (rows already in the store are skipped)
+        # an error is raised again, so the preprocessing does not commit the rows and inserts them again next time
+        stored = 0
+
+        for start in range(0, len(rows), self._batch_size):
+            batch = [[to_timedata(value) if isinstance(value, datetime) else value for value in row] for row in rows[start:start + self._batch_size]]
+
+            try:
+                with self._lock, self._connection:
+                    before = self._connection.total_changes
+                    self._connection.executemany(self._insert, batch)
+                    stored += self._connection.total_changes - before
+            except sqlite3.Error as e:
+                print(e)
+                raise
+
+        return stored
+
+    def to_arrays(self, columns, records):
+        # {column: numpy array}: timedata as datetime64, the basic text columns as object arrays, the measurements as float64 (NaN when missing)
+        arrays = {}
+
+        for index, column in enumerate(columns):
+            values = [record[index] for record in records]
+
+            if column == 'timedata':
+                arrays[column] = np.array([value.replace(' ', 'T') if value else 'NaT' for value in values], dtype = 'datetime64[us]')
+            elif column in ('farm', 'station_number'):
+                arrays[column] = np.array([-1 if value is None else value for value in values], dtype = np.int64)
+            elif column in BASIC_TYPES:
+                arrays[column] = np.array(values, dtype = object)
+            else:
+                arrays[column] = np.array([np.nan if value is None else value for value in values], dtype = np.float64)
+
+        return arrays
+
+    def query(self, statement, parameters, columns):
+        with self._lock:
+            records = self._connection.execute(statement, parameters).fetchall()
+
+        return self.to_arrays(columns, records)
+
+    def get_columns(self, columns):
+        columns = list(columns or self._columns)
+        unknown = [column for column in columns if column not in self._columns]
+
+        if unknown:
+            raise ValueError(f"Unknown columns for the local store: {unknown}")
+
+        return columns
+
+    def get_range(self, station_number, start, end, columns = None, source = None):
+        # the observations of a station with start <= timedata < end, in time order, as {column: numpy array}
+        columns = self.get_columns(columns)
+        statement = f'SELECT {", ".join(columns)} FROM {TABLE} WHERE station_number = ? AND timedata >= ? AND timedata < ?'
+        parameters = [station_number, to_timedata(start), to_timedata(end)]
+
+        if source is not None:
+            statement += ' AND source = ?'
+            parameters.append(source)
+
+        return self.query(f'{statement} ORDER BY timedata', parameters, columns)
+
+    def get_recent(self, station_number, hours = 24, columns = None, source = None):
+        # the observations of the last 'hours' hours of a station ("last 24h for station 7")
+        now = datetime.now(ATHENS)
+
+        return self.get_range(station_number, now - timedelta(hours = hours), now + timedelta(minutes = 1), columns, source)
+
+    def get_latest_per_farm(self, columns = None):
+        # the newest observation of every farm (several stations of the same farm reporting the same time all appear)
+        columns = self.get_columns(columns)
+        statement = f'''
+            SELECT {", ".join(f"{TABLE}.{column}" for column in columns)}
+            FROM {TABLE}
+            JOIN (SELECT farm, MAX(timedata) AS latest FROM {TABLE} GROUP BY farm) AS latest
+                ON latest.farm = {TABLE}.farm AND latest.latest = {TABLE}.timedata
+            ORDER BY {TABLE}.farm, {TABLE}.station_number
+        '''
+
+        return self.query(statement, [], columns)
+
+_stores = {} # (process id, path) -> LocalStore
+
+def get_local_store(config):
+    # the store of the 'local_store' config section, None when it is disabled
+    # a store that can't be opened raises, so the preprocessing keeps the rows for the next run
+    settings = config.get('local_store')
+
+    if settings is None or settings.get('enabled') is not True:
+        return None
+
+    store = _stores.get((os.getpid(), settings['path']))
+
+    if store is None:
+        try:
+            store = LocalStore(config, settings['path'], settings['batch_size'])
+        except sqlite3.Error as e:
+            print(e)
+            raise
+
+        _stores[(os.getpid(), settings['path'])] = store
+
+    return store
@@ -0,0 +1,134 @@
+import re
+
+# every measurement value is '<number><unit>' or '<number> <unit>', e.g. '28.8 °C', '47%', '29.92 inHg' or just '1012'
+VALUE_AND_UNIT = re.compile(r'([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*(.*)')
+
+# (measurement, result unit of 'results_units') -> [(unit found in the value, scale, offset)], the value is converted with: value * scale + offset
+TEMPERATURE_TO_CELSIUS = [
+    ('°c', 1, 0),
+    ('c', 1, 0),
+    ('°f', 1 / 1.8, -32 / 1.8),
+    ('f', 1 / 1.8, -32 / 1.8),
+]
+
+UNIT_CONVERSIONS = {
+    ('temperature', 'c'): TEMPERATURE_TO_CELSIUS,
+    ('dew_point', 'c'): TEMPERATURE_TO_CELSIUS,
+    ('heat_index', 'c'): TEMPERATURE_TO_CELSIUS,
+    ('wind_chill', 'c'): TEMPERATURE_TO_CELSIUS,
+    ('humidity', '%'): [
+        ('%', 1, 0),
+    ],
+    ('wind', 'km/h'): [
+        ('km/h', 1, 0),
+        ('mph', 1.60934, 0),
+        ('m/s', 3.6, 0),
+    ],
+    ('yetos', 'mm'): [
+        ('mm', 1, 0),
+        ('cm', 10, 0),
+        ('in', 25.4, 0),
+        ('inch', 25.4, 0),
+        ('inches', 25.4, 0),
+    ],
+    ('barometer', 'hpa'): [
+        ('hpa', 1, 0),
+        ('mb', 1, 0),
+        ('mmhg', 1.33322, 0),
+        ('in', 33.8639, 0),
+        ('inhg', 33.8639, 0),
+    ],
+    ('solar_radiation', 'w/m², w/m^2'): [
+        ('w/m²', 1, 0),
+        ('w/m^2', 1, 0),
+    ],
+}
+
+# measurement -> number of decimals kept after the conversion
+ROUNDED_MEASUREMENTS = {
+    'wind': 1,
+    'yetos': 1,
+    'barometer': 1,
+}
+
+# measurement -> number of decimals kept only when the value was converted from another unit (°F -> °C), a value already in °C is kept as it is
+ROUNDED_CONVERSIONS = {
+    'temperature': 1,
+    'dew_point': 1,
+}
+
+class UnitParser:
+    # converts raw measurement values to the units of 'results_units'
+    # the conversion table is built once from the config, then every value is split into number and unit with one regex
+    # and converted with the (measurement, unit) entry of the table
+    def __init__(self, results_units):
+        self._conversions = {}
+
+        for measurement, result_unit in results_units.items():
+            if result_unit is None:
+                continue
+
+            result_unit = str(result_unit).lower().strip()
+
+            self._conversions[(measurement, '')] = (1, 0) # a value without unit is already in the result unit
+
+            for unit, scale, offset in UNIT_CONVERSIONS.get((measurement, result_unit), []):
+                self._conversions[(measurement, unit)] = (scale, offset)
+
+    def split(self, value):
+        # '28.8 °C' -> (28.8, '°c'), (None, None) when the value does not start with a number
+        match = VALUE_AND_UNIT.fullmatch(value.strip())
+
+        if match is None:
+            return None, None
+
+        return float(match.group(1)), match.group(2).strip().lower()
+
+    def get_units(self, measurement):
+        # all the units that can be converted for the measurement, longest first
+        return sorted([unit for name, unit in self._conversions if name == measurement and unit], key = len, reverse = True)
+
+    def get_conversion(self, measurement, unit):
+        return self._conversions.get((measurement, unit))
+
+    def convert(self, measurement, value):
+        # returns the value as a number in the result unit, None when it is not a number or its unit can't be converted
+        if value is None:
+            return None
+
+        if isinstance(value, (int, float)):
+            return float(value)
+
+        number, unit = self.split(value)
+
+        if number is None:
+            return None
+
+        conversion = self._conversions.get((measurement, unit))
+
+        if conversion is None:
+            return None
+
+        number = number * conversion[0] + conversion[1]
+
+        if measurement in ROUNDED_MEASUREMENTS:
+            return round(number, ROUNDED_MEASUREMENTS[measurement])
+
+        if measurement in ROUNDED_CONVERSIONS and conversion != (1, 0):
+            return round(number, ROUNDED_CONVERSIONS[measurement])
+
+        return number
+
+_parsers = {} # id(config) -> (config, parser)
+
+def get_unit_parser(config):
+    # one parser per loaded config, built the first time it is needed
+    cached = _parsers.get(id(config))
+
+    if cached is not None and cached[0] is config:
+        return cached[1]
+
+    parser = UnitParser(config['results_units'])
+    _parsers[id(config)] = (config, parser)
+
+    return parser
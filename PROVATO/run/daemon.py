@@ -0,0 +1,102 @@
+from dotenv import load_dotenv
+load_dotenv() # load environment variables
+
+import os, sys, importlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # .../PROVATO, so 'apis', 'export' and 'preprocessing' can be imported
+
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+
+settings = get_project_settings()
+install_reactor(settings['TWISTED_REACTOR']) # must happen before anything imports 'twisted.internet.reactor'
+
+from twisted.internet import defer, reactor, task, threads
+from scrapy.crawler import CrawlerRunner
+
+from export.config import load_config
+from preprocessing.preprocessing import init_preprocessing # imported once, so the preprocessing modules stay loaded between cycles
+from preprocessing.parquet import compact_partitions
+
+class Daemon:
+    # long-running alternative to run/main.py
+    # every collector is scheduled with its own interval ('interval' of its entry in 'weather_websites', in minutes) inside one process
+    # the parsed config, the HTTP connection pool of the API collectors, Scrapy and the preprocessing imports are all kept warm between cycles
+    def __init__(self):
+        self._config = load_config()
+        self._runners = {}
+        self._loops = {}
+
+        configure_logging(settings)
+
+    @property
+    def config(self):
+        return self._config
+
+    def get_interval(self, name):
+        for website in self.config['weather_websites']:
+            if website['code'] == name:
+                return website.get('interval')
+
+        return None
+
+    def get_runner(self, name, collector):
+        # one runner per spider, so every spider keeps exporting to the staging file of its own source
+        runner = self._runners.get(name)
+
+        if runner is None:
+            spider_settings = settings.copy()
+            spider_settings.set('FEEDS', {self.config['preprocessing'][collector['preprocessing']]['staging']: {'format': 'csv'}})
+
+            runner = CrawlerRunner(spider_settings)
+            self._runners[name] = runner
+
+        return runner
+
+    def run_api(self, module_name, class_name):
+        module = importlib.import_module(module_name)
+
+        collector = getattr(module, class_name)()
+        collector.parse()
+
+    def collect(self, name, collector):
+        # a cycle is the collector followed by the preprocessing of its source
+        # the LoopingCall waits for the returned deferred, so two cycles of the same source never overlap
+        # a spider that can't start (unknown name ...) raises right away, 'maybeDeferred' turns it into a failed cycle instead of stopping the loop
+        if collector.get('spider') is not None:
+            deferred = defer.maybeDeferred(lambda: self.get_runner(name, collector).crawl(collector['spider']))
+        else:
+            deferred = threads.deferToThread(self.run_api, collector['module'], collector['class'])
+
+        deferred.addCallback(lambda _: threads.deferToThread(init_preprocessing, [collector['preprocessing']]))
+        deferred.addCallback(lambda _: print(f"Finished cycle: {name}"))
+        deferred.addErrback(lambda failure: print(f"Failed cycle: {name} -> {failure.getErrorMessage()}"))
+
+        return deferred
+
+    def start(self):
+        for name, collector in self.config['collectors'].items():
+            interval = self.get_interval(name)
+
+            if interval is None:
+                print(f"No interval for collector {name}, skipping...")
+                continue
+
+            loop = task.LoopingCall(self.collect, name, collector)
+            loop.start(interval * 60, now = True)
+
+            self._loops[name] = loop
+
+        # the parquet files of every finished day are merged once per hour (preprocessing/parquet.py)
+        if self.config.get('parquet', {}).get('enabled') is True:
+            loop = task.LoopingCall(threads.deferToThread, compact_partitions)
+            loop.start(3600, now = True)
+
+            self._loops['parquet'] = loop
+
+        reactor.run()
+
+if __name__ == '__main__':
+    daemon = Daemon()
+    daemon.start()
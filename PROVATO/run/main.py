@@ -1,27 +1,84 @@
 from dotenv import load_dotenv
 load_dotenv() # load environment variables
 
-import os, yaml, subprocess, time
-
-try:
-    with open(os.getenv('CONFIG'), 'r') as conf:
-        config = yaml.safe_load(conf)
-
-    time.sleep(3)
-
-    for item in config['commands']:
-        if item == 'preprocessing':
-            time.sleep(15)
-        else:
-            time.sleep(5)
-
-        subprocess.run(config['commands'][item], shell = True, check = True)
-
-except FileNotFoundError as e:
-    print(f"Config file not found: {e}")
-except yaml.YAMLError as e:
-    print(f"Error parsing YAML file: {e}")
-except subprocess.CalledProcessError as e:
-    print(f"Command failed: {e.cmd}")
-except Exception as e:
-    print(f"Unexpected error: {e}")
\ No newline at end of file
+import os, sys, yaml, importlib
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # .../PROVATO, so 'apis', 'export' and 'preprocessing' can be imported
+
+from export.config import load_config
+
+def run_spider(spider_name, staging_path):
+    # the twisted reactor can only be started once per process, so every spider runs in its own worker process
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.set('FEEDS', {staging_path: {'format': 'csv'}}) # same as 'scrapy crawl <spider_name> -o <staging_path>'
+
+    process = CrawlerProcess(settings)
+    process.crawl(spider_name)
+    process.start()
+
+def run_api(module_name, class_name):
+    module = importlib.import_module(module_name)
+
+    collector = getattr(module, class_name)()
+    collector.parse()
+
+def run_collector(collector, config):
+    if collector.get('spider') is not None:
+        run_spider(collector['spider'], config['preprocessing'][collector['preprocessing']]['staging'])
+    else:
+        run_api(collector['module'], collector['class'])
+
+def run_preprocessing(source):
+    from preprocessing.preprocessing import init_preprocessing
+
+    init_preprocessing([source])
+
+def init_orchestrator():
+    # all collectors run at the same time, each in its own worker process
+    # a source is preprocessed as soon as every collector that writes to its staging file has finished, so one cycle takes about as long as the slowest source
+    config = load_config()
+    collectors = config['collectors']
+
+    feeding = {}
+
+    for name, collector in collectors.items():
+        feeding.setdefault(collector['preprocessing'], set()).add(name)
+
+    with ProcessPoolExecutor(max_workers = len(collectors), max_tasks_per_child = 1) as executor:
+        running = {executor.submit(run_collector, collector, config): ('collector', name) for name, collector in collectors.items()}
+
+        while running:
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+
+            for future in done:
+                kind, name = running.pop(future)
+
+                try:
+                    future.result()
+                    print(f"Finished {kind}: {name}")
+                except Exception as e:
+                    print(f"Failed {kind}: {name} -> {e}")
+
+                if kind == 'preprocessing':
+                    continue
+
+                source = collectors[name]['preprocessing']
+                feeding[source].discard(name)
+
+                if not feeding[source]:
+                    running[executor.submit(run_preprocessing, source)] = ('preprocessing', source)
+
+if __name__ == '__main__':
+    try:
+        init_orchestrator()
+    except FileNotFoundError as e:
+        print(f"Config file not found: {e}")
+    except yaml.YAMLError as e:
+        print(f"Error parsing YAML file: {e}")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
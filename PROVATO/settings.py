@@ -20,14 +20,15 @@ NEWSPIDER_MODULE = "PROVATO.spiders"
 ROBOTSTXT_OBEY = True
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+# every response builds its own record (export/record.py), so concurrent responses can't mix the fields of different stations
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
 #DOWNLOAD_DELAY = 3
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 16
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -50,15 +51,20 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "PROVATO.middlewares.ProvatoDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "PROVATO.middlewares.ProvatoDownloaderMiddleware": 543,
+}
+
+# Conditional fetching of the station pages (see ProvatoDownloaderMiddleware)
+CONDITIONAL_FETCH_ENABLED = True
+CONDITIONAL_FETCH_STATE = "data/conditional_fetch.json"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "PROVATO.extensions.RateControllerExtension": 500, # adaptive per-host concurrency and delay ('rate_controller' in config.yaml)
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
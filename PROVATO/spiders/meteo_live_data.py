@@ -5,6 +5,7 @@ import scrapy, os, yaml
 from datetime import datetime as dt
 
 from ..export.main import WeatherData
+from ..export.xpaths import get_selectors, get_tree, get_fragment_tree
 
 class Meteo_Live_Data(scrapy.Spider, WeatherData):
     name = os.path.splitext(os.path.basename(__file__))[0] # specifies the spider name, using the file name without the .py extension
@@ -12,83 +13,130 @@ class Meteo_Live_Data(scrapy.Spider, WeatherData):
     def __init__(self):
         WeatherData.__init__(self)
 
+        self._selectors = get_selectors(self.config, 'meteo_live_data_paths') # compiled once, an invalid XPath stops the spider here
+        self._parsing = self.config['html_parsing'][self.name]
+
     def parse(self, response):
         # for every website we scrape, requests are initiated via the 'start_requests' method and each response is processed and returned via the 'parse' method
         
+        # everything read from the response stays local to this call, so responses can be processed concurrently
+        tree = self.load_tree(response)
+
         if self.config['check_station_availability'] is True:
-            if self.init_check_station_availability(response) is True:
+            if self.init_check_station_availability(tree) is True:
+                # an offline station is not requested again until its back-off ends (export/health.py)
+                self.station_failed(response.meta['station'], 'offline')
                 return
             
-        start_scraping = self.init_scraping_data(response)
+        start_scraping = self.init_scraping_data(response, tree)
+
+        self.station_ok(response.meta['station'])
 
         yield from self.yield_all_items(start_scraping)
 
-    def init_check_station_availability(self, response):
+    def init_check_station_availability(self, tree):
         # checks if station is offline or online 
-        if response.xpath(self.config['meteo_live_data_paths']['station_availability']).get() is not None:
+        if self._selectors.extract('station_availability', tree) is not None:
             print("Station is offline, skipping...")
             return True
         
         print("Station is online, scraping...")
 
-    def init_scraping_data(self, response):
+    def init_scraping_data(self, response, tree = None):
         # this is the method that initializes the basic data and measurements to be retrieved from meteo
-        # it checks from the config if we can retrieve the basic data and the measurement. If it is true, all the basic data and all the measurements for each station are collected using the 'get_data_from_meteo' method
-        # self.init_get_stations(2)
-        
-        self.set_farm(response.meta['farm'])
-        self.set_source(response.meta['source'])
-        self.set_timedata(self.get_day_and_hour(response))
-        self.set_city(response.meta['city'])
-        self.set_nomos(response.meta['nomos'])
-
-        self.run_basic()
+        # it checks from the config if we can retrieve the basic data and the measurement. If it is true, all the basic data and all the measurements for each station are collected using the 'get_data' method
+        # the record of the response is built from the station of the request (response.meta['station']) and returned as a new item
+        tree = tree if tree is not None else self.load_tree(response)
+        table = self.get_table(tree)
 
-        self.run_measurements_scraping(response)
+        measurements = self.get_measurements(
+            lambda measurement, measurement_alternative_names, found: self.get_data(table, measurement, measurement_alternative_names, found)
+        )
 
-        return self.all_measurements
+        return self.build_record(response.meta['station'], self.get_day_and_hour(tree), measurements).as_dict()
 
-    def get_data(self, response, measurement, measurement_alternative_names):
+    def get_data(self, table, measurement, measurement_alternative_names, found):
         # this is the method where we retrieve the measurements from meteo
         # we check if the data from meteo contains the words that we have specified in the config, in the 'weather_live_conditions_measurements' field
+        # the labels are looked up in the table read once per response ('get_table'), if several labels match, the first row of the table wins
+        # 'found' are the measurements of the record found so far
         
         measurement = measurement.lower()
 
-        for row in self.get_path(response):
-            label = row.xpath(self.config['meteo_live_data_paths']['get_data_table_label']).get()
-            value = row.xpath(self.config['meteo_live_data_paths']['get_data_table_value']).get()
+        # meteo has a single 'wind' row with both speed and direction ('5 km/h NW' ...)
+        wind_speed = 'wind' in measurement and 'speed' in measurement_alternative_names
+        wind_direction = 'direction' in measurement and 'direction' in measurement_alternative_names
 
-            if row is None or label is None or value is None:
-                continue
+        labels = [name for name in measurement_alternative_names if name in table]
 
-            label = label.lower()
-            value = value.strip()
+        if (wind_speed or wind_direction) and 'wind' in table:
+            labels.append('wind')
 
-            if 'wind' in measurement and label == 'wind' and 'speed' in measurement_alternative_names:
-                value = value.split(' ')
+        if not labels:
+            return None
 
-                return {measurement: f"{value[0] + value[1]}"}
-            
-            if 'direction' in measurement and label == 'wind' and 'direction' in measurement_alternative_names:
-                value = value.split(' ')[3]
+        label = min(labels, key = lambda name: table[name][0])
+        value = table[label][1]
 
-                if self.all_measurements['wind'] == 0.0:
-                    return {measurement: 0.0}
+        if label == 'wind' and wind_speed:
+            value = value.split(' ')
 
-                return {measurement: value}
-            
-            if label not in measurement_alternative_names:
-                continue
+            return {measurement: f"{value[0] + value[1]}"}
+
+        if label == 'wind' and wind_direction:
+            value = value.split(' ')[3]
+
+            if found.get('wind') == 0.0:
+                return {measurement: 0.0}
 
             return {measurement: value}
 
-    def get_path(self, response):
+        return {measurement: value}
+
+    def get_table(self, tree):
+        # reads the data table of meteo once: {label (lower case): (row number, value)}, the first row of every label is kept
+        table = {}
+
+        for number, row in enumerate(self.get_path(tree)):
+            label = self._selectors.extract('get_data_table_label', row)
+            value = self._selectors.extract('get_data_table_value', row)
+
+            if label is None or value is None:
+                continue
+
+            table.setdefault(label.lower(), (number, value.strip()))
+
+        return table
+
+    def get_path(self, tree):
         # method for retrieving the data table from meteo
-        return response.xpath(self.config['meteo_live_data_paths']['get_data_table'])
+        return self._selectors.select('get_data_table', tree)
     
-    def get_day_and_hour(self, response):
+    def load_tree(self, response):
+        # in 'fragment' mode only the headline and the realtime table are parsed, the whole page if they are not found
+        if self._parsing['mode'] == 'fragment':
+            tree = get_fragment_tree(response, self._parsing['markers'], self._parsing.get('optional'))
+
+            if tree is not None and self._selectors.select('get_data_table', tree):
+                return tree
+
+        return get_tree(response)
+
+    def get_day_and_hour(self, tree):
         # method for extracting the day and hour from the meteo table
-        return response.xpath(self.config['meteo_live_data_paths']['get_day_and_hour']).get()
+        return self._selectors.extract('get_day_and_hour', tree)
+
+    def get_observation_time(self, response):
+        # used by the conditional fetch middleware to skip a page whose observation was already collected
+        return self.get_day_and_hour(self.load_tree(response))
+
+    def closed(self, reason):
+        # called by scrapy when the spider finishes
+        if self.planner is not None:
+            self.planner.report()
+
+        self.save_health()
+        self._selectors.report()
 
     def start_requests(self):
         # method where scraping begins in scrapy
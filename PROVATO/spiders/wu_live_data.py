@@ -5,6 +5,9 @@ import scrapy, os, re
 from datetime import datetime as dt
 
 from ..export.main import WeatherData
+from ..export.xpaths import get_selectors, get_tree, get_fragment_tree
+
+ROTATION = re.compile(r'rotate\(([\d.]+)deg\)') # the wind compass is rotated by the wind direction in degrees
 
 class WU_Live_Data(scrapy.Spider, WeatherData):
     name = os.path.splitext(os.path.basename(__file__))[0] # specifies the spider name, using the file name without the .py extension
@@ -12,6 +15,9 @@ class WU_Live_Data(scrapy.Spider, WeatherData):
     def __init__(self):
         WeatherData.__init__(self)
 
+        self._selectors = get_selectors(self.config, 'weather-underground_live_data_paths') # compiled once, an invalid XPath stops the spider here
+        self._parsing = self.config['html_parsing'][self.name]
+
     def parse(self, response): 
         # for every website we scrape, requests are initiated via the 'start_requests' method and each response is processed and returned via the 'parse' method
         # if self.config['check_station_availability'] is True:
@@ -19,6 +25,8 @@ class WU_Live_Data(scrapy.Spider, WeatherData):
         #         return
             
         start_scraping = self.init_scraping_data(response)
+
+        self.station_ok(response.meta['station'])
         
         yield from self.yield_all_items(start_scraping)
 
@@ -33,25 +41,45 @@ class WU_Live_Data(scrapy.Spider, WeatherData):
 
     def init_scraping_data(self, response):
         # this is the method that initializes the basic data and measurements to be retrieved from weather-underground
-        # it checks from the config if we can retrieve the basic data and the measurement. If it is true, all the basic data and all the measurements for each station are collected using the 'get_data_from_wu' method
-        self.init_get_stations(2)
-        
-        self.set_farm(response.meta['farm'])
-        self.set_source(response.meta['source'])
-        self.set_timedata(self.get_day_and_hour(response))
-        self.set_city(response.meta['city'])
-        self.set_nomos(response.meta['nomos'])
+        # it checks from the config if we can retrieve the basic data and the measurement. If it is true, all the basic data and all the measurements for each station are collected using the 'get_data' method
+        # every selector is evaluated once, on the same tree: {'get_day_and_hour': ..., 'temperature.value': ..., 'temperature.unit': ..., ...}
+        # the record of the response is built from the station of the request (response.meta['station']) and returned as a new item,
+        # everything read from the response stays local to this call, so responses can be processed concurrently
+        values = self.extract_values(response)
 
-        self.run_basic()
+        measurements = self.get_measurements(
+            lambda measurement, measurement_alternative_names, found: self.get_data(values, measurement, measurement_alternative_names)
+        )
 
-        self.run_measurements_scraping(response)
-
-        return self.all_measurements
+        return self.build_record(response.meta['station'], self.get_day_and_hour(values), measurements).as_dict()
     
-    def get_day_and_hour(self, response):
-        return response.xpath(self.config['weather-underground_live_data_paths']['get_day_and_hour']).get()
+    def extract_values(self, response):
+        # in 'fragment' mode only the elements of the current conditions are parsed,
+        # the whole page if they are not found or if a measurement is missing from them
+        if self._parsing['mode'] == 'fragment':
+            tree = get_fragment_tree(response, self._parsing['markers'], self._parsing.get('optional'))
+
+            if tree is not None:
+                values = self._selectors.extract_all(tree)
+
+                if all(value is not None for name, value in values.items() if name.endswith('.value')):
+                    return values
+
+        return self._selectors.extract_all(get_tree(response))
+
+    def get_observation_time(self, response):
+        # used by the conditional fetch middleware to skip a page whose observation was already collected
+        tree = None
+
+        if self._parsing['mode'] == 'fragment':
+            tree = get_fragment_tree(response, self._parsing['markers'], self._parsing.get('optional'))
+
+        return self._selectors.extract('get_day_and_hour', tree if tree is not None else get_tree(response))
+
+    def get_day_and_hour(self, values):
+        return values.get('get_day_and_hour')
     
-    def get_data(self, response, measurement, measurement_alternative_names):
+    def get_data(self, values, measurement, measurement_alternative_names):
         measurement = measurement.lower()
         measurement_alternative_names = [isinstance(word, str) and word.lower() for word in measurement_alternative_names]
 
@@ -60,25 +88,28 @@ class WU_Live_Data(scrapy.Spider, WeatherData):
                 continue
 
             if item == 'direction':
-                return self.get_wind_direction(response, measurement)
+                return self.get_wind_direction(values, measurement)
 
-            return self.get_value_and_unit(response, measurement)
+            return self.get_value_and_unit(values, measurement)
 
-    def get_wind_direction(self, response, measurement):
+    def get_wind_direction(self, values, measurement):
         # https://en.wikipedia.org/wiki/Cardinal_direction
         # https://en.wikipedia.org/wiki/Compass_rose
         # https://stackoverflow.com/questions/7490660/converting-wind-direction-in-angles-to-text-words
-        path = response.xpath(self.config['weather-underground_live_data_paths'][measurement]['value']).get()
+        path = values.get(f'{measurement}.value')
+
+        if path is None:
+            return None
         
-        match_with_path = re.search(r'rotate\(([\d.]+)deg\)', path)
+        match_with_path = ROTATION.search(path)
 
         if match_with_path is None:
             return None
 
         return {measurement: float(match_with_path.group(1))} # degrees
     
-    def get_value_and_unit(self, response, measurement):
-        value = response.xpath(self.config['weather-underground_live_data_paths'][measurement]['value']).get()
+    def get_value_and_unit(self, values, measurement):
+        value = values.get(f'{measurement}.value')
 
         if value is None:
             return {measurement: None}
@@ -86,13 +117,21 @@ class WU_Live_Data(scrapy.Spider, WeatherData):
         if self.config['weather-underground_live_data_paths'][measurement]['unit'] is None:
             return {measurement: value}
 
-        unit = response.xpath(self.config['weather-underground_live_data_paths'][measurement]['unit']).get()
+        unit = values.get(f'{measurement}.unit')
 
         if unit is None and measurement == 'wind':
             unit = 'mph'
 
         return {measurement: f'{value}{unit}'}
         
+    def closed(self, reason):
+        # called by scrapy when the spider finishes
+        if self.planner is not None:
+            self.planner.report()
+
+        self.save_health()
+        self._selectors.report()
+
     def start_requests(self):
         # method where scraping begins in scrapy
         # we check in the config in the farms field, which farm has meteo as the source, and we scrape using its URL
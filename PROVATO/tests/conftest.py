@@ -0,0 +1,7 @@
+import os, sys
+
+# the tests import the modules like the collectors do (from PROVATO, with the config of the repository), whatever directory pytest runs from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault('CONFIG', os.path.join(os.path.dirname(ROOT), 'config.yaml'))
@@ -0,0 +1,53 @@
+import pytest
+
+from datetime import datetime
+
+from export.config import Config, load_config, thaw
+from export.timestamps import ATHENS
+from preprocessing.dedup import DedupIndex
+from preprocessing.preprocessing import clean_rows, write_csv
+
+# the row mode and the batch mode (preprocessing/columnar.py) must write the same cleaned and failed files
+
+ROWS = [
+    ['farm3', 'Meteo', '29/07/2025 01:00', '2025-07-29 01:13:36', 'Γκάζι', 'Αττικής', '7', '28.8 °C', '47 %', '0.0 Km/h', 'W', '0.0 mm', '1012 hPa', '16.1 °C', '29.6 °C', '28.8 °C', ''],
+    ['farm3', 'Meteo', '29/07/2025 01:00', '2025-07-29 01:13:36', 'Γκάζι', 'Αττικής', '7', '28.8 °C', '47 %', '0.0 Km/h', 'W', '0.0 mm', '1012 hPa', '16.1 °C', '29.6 °C', '28.8 °C', ''],
+    ['farm3', 'Meteo', '29/07/2025 01:10', '2025-07-29 01:13:36', 'Περιστέρι', 'Αττικής', '9', '80 F', '47 %', '3.0 mph', 'NNE', '0.1 in', '29.9 inHg', '61 F', '29.6 °C', '28.8 °C', ''],
+    ['farm1', 'Meteo', '29/07/2025 01:20', '2025-07-29 01:13:36', 'Περιστέρι', 'Αττικής', '9', '5 °C', '47 %', '20 km/h', 'NNE', '1 cm', '1000 mb', '61 F', '5 °C', '2 °C', '300 w/m²'],
+    ['farm1', 'Meteo', 'bad', '2025-07-29 01:13:36', 'Περιστέρι', 'Αττικής', '9', '5 °C', '47 %', '20 km/h', 'NNE', '1 cm', '1000 mb', '61 F', '5 °C', '2 °C', '300 w/m²'],
+    ['farm1', 'Meteo', '29/07/2025 01:30', '2025-07-29 01:13:36', 'Περιστέρι', 'Αττικής', '9', 'abc', '47 %', '20 km/h', 'NNE', '1 cm', '1000 mb', '61 F', '5 °C', '2 °C', '300 w/m²'],
+    ['farm9', 'Meteo', '29/07/2025 01:40', '2025-07-29 01:13:36', 'Περιστέρι', 'Αττικής', '9', '5 °C', '47 %', '20 km/h', 'NNE', '1 cm', '1000 mb', '', '', '', ''],
+    ['farm1', 'Meteo', '29/07/2025 01:50', '2025-07-29 01:13:36'],
+]
+
+def clean(tmp_path, mode):
+    settings = thaw(load_config())
+    settings['preprocessing_mode'] = mode
+    config = Config(settings)
+
+    now = datetime(2025, 7, 29, 2, tzinfo = ATHENS)
+    cleaned_rows, failed_rows = clean_rows([list(row) for row in ROWS], 'meteo', config, DedupIndex(str(tmp_path / f'{mode}.dedup')))
+
+    write_csv(str(tmp_path / mode / 'cleaned'), now, cleaned_rows, config)
+    write_csv(str(tmp_path / mode / 'failed'), now, failed_rows, config)
+
+    return [(tmp_path / mode / kind / '2025' / '07' / '29.csv').read_text(encoding = 'utf-8') for kind in ('cleaned', 'failed')]
+
+def test_row_and_batch_mode_write_the_same_files(tmp_path):
+    row_cleaned, row_failed = clean(tmp_path, 'row')
+    batch_cleaned, batch_failed = clean(tmp_path, 'batch')
+
+    assert row_cleaned == batch_cleaned
+    assert row_failed == batch_failed
+    assert len(row_cleaned.splitlines()) == 4 # header + 3 rows
+    assert len(row_failed.splitlines()) == 6 # header + duplicate, bad time, bad temperature, unknown farm, short row
+
+def test_failed_rows_are_written_as_staged(tmp_path):
+    _, failed = clean(tmp_path, 'batch')
+
+    assert 'abc' in failed and ',bad,' in failed
+
+def test_direction_without_wind_is_an_integer(tmp_path):
+    cleaned, _ = clean(tmp_path, 'batch')
+
+    assert ',-1,' in cleaned.splitlines()[1]
@@ -0,0 +1,124 @@
+import os, shutil, subprocess, psycopg2, pytest
+
+from datetime import datetime
+from psycopg2.pool import ThreadedConnectionPool
+
+from export.config import Config, load_config, thaw
+from export.timestamps import ATHENS
+from preprocessing import database
+from preprocessing.database import DatabaseLoader, get_loader
+
+# the loader against a throwaway postgres cluster, skipped when postgres is not installed
+# initdb and pg_ctl are looked up in PG_BIN, otherwise on the PATH
+
+def find_binary(name):
+    directory = os.getenv('PG_BIN')
+
+    return os.path.join(directory, name) if directory else shutil.which(name)
+
+@pytest.fixture(scope = 'module')
+def server(tmp_path_factory):
+    initdb, pg_ctl = find_binary('initdb'), find_binary('pg_ctl')
+
+    if not initdb or not pg_ctl or not os.path.exists(initdb):
+        pytest.skip("postgres is not installed (initdb, pg_ctl)")
+
+    directory = tmp_path_factory.mktemp('postgres')
+    data = str(directory / 'data')
+
+    subprocess.run([initdb, '-D', data, '-U', 'postgres', '--auth', 'trust'], check = True, capture_output = True)
+    subprocess.run([pg_ctl, '-D', data, '-l', str(directory / 'log'), '-w', '-o', f"-k {directory} -c listen_addresses=''", 'start'], check = True, capture_output = True)
+
+    yield {'host': str(directory), 'dbname': 'postgres', 'user': 'postgres'}
+
+    subprocess.run([pg_ctl, '-D', data, '-m', 'immediate', '-w', 'stop'], capture_output = True)
+
+@pytest.fixture
+def config():
+    return load_config()
+
+@pytest.fixture
+def connection(server, config):
+    # the tables the loader joins, created again for every test: farm 1 with the stations 1 and 2
+    measurements = ', '.join(f'{measurement} double precision' for measurement in config.measurements)
+    connection = psycopg2.connect(**server)
+    connection.autocommit = True
+
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS meteo_data, meteo_farms, meteo_stations, farms_api')
+        cursor.execute('CREATE TABLE farms_api (id_api integer PRIMARY KEY)')
+        cursor.execute('CREATE TABLE meteo_stations (id integer PRIMARY KEY)')
+        cursor.execute('CREATE TABLE meteo_farms (farm integer, station integer)')
+        cursor.execute(f'CREATE TABLE meteo_data (station integer, source text, timedata timestamp, crawled timestamptz, {measurements})')
+        cursor.execute('INSERT INTO farms_api VALUES (1)')
+        cursor.execute('INSERT INTO meteo_stations VALUES (1), (2)')
+        cursor.execute('INSERT INTO meteo_farms VALUES (1, 1), (1, 2)')
+
+    yield connection
+
+    connection.close()
+
+@pytest.fixture
+def loader(server, config, connection):
+    pool = ThreadedConnectionPool(1, 2, **server)
+
+    yield DatabaseLoader(config, pool, batch_size = 2)
+
+    pool.closeall()
+
+def build_row(config, station_number, hour, timedata = None):
+    # a cleaned row of farm 1, with only the temperature measured
+    measurements = [28.5] + [None] * (len(config.measurements) - 1)
+    timedata = timedata or datetime(2025, 7, 29, hour)
+
+    return [1, 'meteo', timedata, datetime(2025, 7, 29, hour, 5, tzinfo = ATHENS), 'Τεγέα', 'Αρκαδίας', station_number] + measurements
+
+def count(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT station, timedata, temperature FROM meteo_data ORDER BY station, timedata')
+
+        return cursor.fetchall()
+
+def test_load_inserts_every_observation_once(config, connection, loader):
+    rows = [build_row(config, 1, hour) for hour in (1, 2, 3)] + [build_row(config, 2, 1), build_row(config, 1, 1)]
+
+    assert loader.load(rows) == 4
+    assert loader.load(rows) == 0
+    assert count(connection) == [
+        (1, datetime(2025, 7, 29, 1), 28.5),
+        (1, datetime(2025, 7, 29, 2), 28.5),
+        (1, datetime(2025, 7, 29, 3), 28.5),
+        (2, datetime(2025, 7, 29, 1), 28.5),
+    ]
+
+def test_load_skips_unknown_stations(config, connection, loader):
+    assert loader.load([build_row(config, 9, 1), build_row(config, 1, 1)]) == 1
+    assert [row[0] for row in count(connection)] == [1]
+
+def test_load_raises_and_keeps_the_committed_batches(config, connection, loader):
+    rows = [build_row(config, 1, 1), build_row(config, 1, 2), build_row(config, 1, 3, timedata = 'not a time')]
+
+    with pytest.raises(psycopg2.DataError):
+        loader.load(rows)
+
+    assert len(count(connection)) == 2
+
+    # the rows loaded again (once fixed) only insert what the failed batch missed, and the pool still works
+    rows[2] = build_row(config, 1, 3)
+
+    assert loader.load(rows) == 1
+    assert len(count(connection)) == 3
+
+def test_get_loader_raises_when_the_database_is_unreachable(config, monkeypatch, tmp_path):
+    settings = thaw(config)
+    settings['database'] = {'enabled': True, 'pool_min': 1, 'pool_max': 2, 'batch_size': 10}
+
+    monkeypatch.setattr(database, '_loaders', {})
+    monkeypatch.setenv('PG_HOST', str(tmp_path)) # a directory without a postgres socket
+    monkeypatch.setenv('PG_DB', 'postgres')
+    monkeypatch.setenv('PG_USER', 'postgres')
+    monkeypatch.delenv('PG_PORT', raising = False)
+    monkeypatch.delenv('PG_PASS', raising = False)
+
+    with pytest.raises(psycopg2.OperationalError):
+        get_loader(Config(settings))
@@ -0,0 +1,40 @@
+import numpy as np, pytest
+
+from preprocessing.derived import METPY_METRICS, METRICS
+
+# the NumPy metrics against metpy, which they replace: same values and same undefined values (nan)
+pytest.importorskip('metpy')
+
+TEMPERATURES = np.arange(-30, 50, 0.5) # °C, freezing to very hot
+HUMIDITIES = np.array([0, 0.5, 1, 5, 13, 50, 85, 86, 99, 100], dtype = float) # %, with the dry and humid adjustments of the heat index
+WINDS = np.array([0, 1, 4.8, 4.9, 10, 40, 100], dtype = float) # km/h, calm to storm, around the 3 mph limit of the wind chill
+
+def grid(*values):
+    return [axis.ravel() for axis in np.meshgrid(*values)]
+
+def assert_same(name, *args):
+    np.testing.assert_allclose(METRICS[name](*args), METPY_METRICS[name](*args), rtol = 1e-9, atol = 1e-9, equal_nan = True)
+
+def test_heat_index():
+    assert_same('heat_index', *grid(TEMPERATURES, HUMIDITIES))
+
+def test_wind_chill():
+    assert_same('wind_chill', *grid(TEMPERATURES, WINDS))
+
+def test_wind_chill_is_undefined_in_calm_wind():
+    assert np.isnan(METRICS['wind_chill'](np.array([-20.0, -5.0, 0.0]), np.zeros(3))).all()
+
+def test_dew_point():
+    assert_same('dew_point', *grid(TEMPERATURES, HUMIDITIES))
+
+def test_dew_point_is_undefined_without_humidity():
+    assert np.isnan(METRICS['dew_point'](np.array([-10.0, 20.0]), np.zeros(2))).all()
+
+@pytest.mark.parametrize('name', sorted(METRICS))
+def test_missing_values_stay_missing(name):
+    # nan in either input (a measurement that was not collected) gives nan, the other rows are calculated
+    first = np.array([np.nan, 30.0, np.nan])
+    second = np.array([50.0, np.nan, np.nan])
+
+    assert np.isnan(METRICS[name](first, second)).all()
+    assert_same(name, np.array([np.nan, 35.0, -10.0]), np.array([60.0, 70.0, 30.0]))
@@ -0,0 +1,31 @@
+import time
+
+from export.fetcher import AsyncFetcher
+from export.planner import Station
+
+class SlowSession:
+    # a session whose every request takes 'delay' seconds
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get(self, url, timeout = None):
+        time.sleep(self.delay)
+
+        return url
+
+    def close(self):
+        pass
+
+def test_fetch_all_runs_the_requests_at_the_configured_concurrency():
+    fetcher = AsyncFetcher(concurrency = 16)
+    fetcher._session = SlowSession(0.5)
+    station = Station('farm1', 'SODA_FARM1_STATION1', 'SoDa', 'c', 'n', 'soda', 1)
+    jobs = [(f'http://example.com/{number}', station) for number in range(16)]
+
+    start = time.perf_counter()
+    responses = list(fetcher.fetch_all(jobs))
+    elapsed = time.perf_counter() - start
+
+    # all 16 requests at once: about the time of one request, not of several rounds of the default executor
+    assert sorted(response for response, _, _ in responses) == sorted(url for url, _ in jobs)
+    assert elapsed < 1.0
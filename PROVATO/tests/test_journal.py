@@ -0,0 +1,12 @@
+from export.config import load_config
+from preprocessing.journal import StagingJournal
+
+def test_read_skips_the_current_and_legacy_headers(tmp_path):
+    columns = list(load_config().columns)
+    legacy = [column for column in columns if column != 'station_number']
+    staging = tmp_path / 'staging.csv'
+    staging.write_text('\n'.join([','.join(legacy), 'farm1,Meteo,29/07/2025 01:00', ','.join(columns), 'farm1,Meteo,29/07/2025 02:00', '']), encoding = 'utf-8')
+
+    journal = StagingJournal(str(staging), columns)
+
+    assert [row[2] for row in journal.read()] == ['29/07/2025 01:00', '29/07/2025 02:00']
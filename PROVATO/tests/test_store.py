@@ -0,0 +1,49 @@
+import numpy as np
+
+from datetime import datetime
+
+from export.config import load_config
+from preprocessing.store import LocalStore
+
+def build_row(config, farm, station_number, hour, temperature):
+    # a cleaned row, with only the temperature measured
+    measurements = [temperature] + [None] * (len(config.measurements) - 1)
+
+    return [farm, 'Meteo', datetime(2025, 7, 29, hour), '2025-07-29 01:13:36', 'Τεγέα', 'Αρκαδίας', station_number] + measurements
+
+def test_insert_the_same_batch_again_changes_nothing(tmp_path):
+    config = load_config()
+    store = LocalStore(config, str(tmp_path / 'store.sqlite'), batch_size = 2)
+    rows = [build_row(config, 1, 7, hour, 20.0 + hour) for hour in range(5)]
+
+    assert store.insert(rows) == 5
+    assert store.insert(rows) == 0
+    assert len(store.get_range(7, datetime(2025, 7, 29), datetime(2025, 7, 30))['timedata']) == 5
+
+def test_get_range_returns_typed_arrays_of_one_station(tmp_path):
+    config = load_config()
+    store = LocalStore(config, str(tmp_path / 'store.sqlite'))
+    store.insert([build_row(config, 1, 7, 3, 23.5), build_row(config, 1, 7, 1, 21.5), build_row(config, 1, 8, 2, 30.0), build_row(config, 1, 7, 6, 26.0)])
+
+    arrays = store.get_range(7, datetime(2025, 7, 29, 1), datetime(2025, 7, 29, 6), columns = ['timedata', 'station_number', 'temperature', 'humidity', 'source'])
+
+    assert arrays['timedata'].dtype == np.dtype('datetime64[us]')
+    assert arrays['station_number'].dtype == np.int64
+    assert arrays['temperature'].dtype == np.float64
+    assert arrays['source'].dtype == object
+
+    np.testing.assert_array_equal(arrays['timedata'], np.array(['2025-07-29T01:00', '2025-07-29T03:00'], dtype = 'datetime64[us]'))
+    np.testing.assert_array_equal(arrays['station_number'], [7, 7])
+    np.testing.assert_array_equal(arrays['temperature'], [21.5, 23.5])
+    assert np.isnan(arrays['humidity']).all()
+
+def test_get_latest_per_farm_returns_the_newest_row(tmp_path):
+    config = load_config()
+    store = LocalStore(config, str(tmp_path / 'store.sqlite'))
+    store.insert([build_row(config, 1, 7, 1, 21.0), build_row(config, 1, 7, 4, 24.0), build_row(config, 2, 9, 2, 12.0), build_row(config, 2, 9, 1, 11.0)])
+
+    arrays = store.get_latest_per_farm(columns = ['farm', 'timedata', 'temperature'])
+
+    np.testing.assert_array_equal(arrays['farm'], [1, 2])
+    np.testing.assert_array_equal(arrays['timedata'], np.array(['2025-07-29T04:00', '2025-07-29T02:00'], dtype = 'datetime64[us]'))
+    np.testing.assert_array_equal(arrays['temperature'], [24.0, 12.0])
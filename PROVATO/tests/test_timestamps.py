@@ -0,0 +1,55 @@
+import pytest
+
+from datetime import datetime
+
+from export.timestamps import convert, parse_meteo, parse_open_meteo, parse_soda, parse_wu, to_epoch
+
+# every source format, converted to the cleaned format (Athens local time)
+
+@pytest.mark.parametrize('source, timedata, cleaned', [
+    ('soda', '2025-07-29 01:00:00', '2025-07-29 01:00:00.000000'),
+    ('meteo', '29/07/2025 01:00', '2025-07-29 01:00:00.000000'),
+    ('meteo', '1/7/2025 13:05', '2025-07-01 13:05:00.000000'),
+    ('wu', '1:05 AM on July 29, 2025 EEST', '2025-07-29 01:05:00.000000'),
+    ('wu', '12:30 PM on January 5, 2025 EET', '2025-01-05 12:30:00.000000'),
+    ('wu', '12:10 AM on January 5, 2025', '2025-01-05 00:10:00.000000'),
+    ('open-meteo', '1753740000', '2025-07-29 01:00:00.000000'),
+    ('open-meteo', '2025-07-28T22:00', '2025-07-29 01:00:00.000000'),
+    ('open-meteo', '2025-01-05T10:00', '2025-01-05 12:00:00.000000'),
+])
+def test_convert(source, timedata, cleaned):
+    assert convert(timedata, source) == cleaned
+
+def test_convert_unknown_source():
+    assert convert('2025-07-29 01:00:00', 'unknown') is None
+
+@pytest.mark.parametrize('timedata, cleaned', [
+    # summer time starts on 30/03/2025: 03:00 EET is 04:00 EEST
+    ('2025-03-30T00:59', '2025-03-30 02:59:00.000000'),
+    ('2025-03-30T01:00', '2025-03-30 04:00:00.000000'),
+    # summer time ends on 26/10/2025: 04:00 EEST is 03:00 EET, the hour from 03:00 to 04:00 happens twice
+    ('2025-10-26T00:30', '2025-10-26 03:30:00.000000'),
+    ('2025-10-26T01:30', '2025-10-26 03:30:00.000000'),
+    ('2025-10-26T02:00', '2025-10-26 04:00:00.000000'),
+])
+def test_open_meteo_across_the_athens_summer_time_changes(timedata, cleaned):
+    assert convert(timedata, 'open-meteo') == cleaned
+
+def test_to_epoch_across_the_athens_summer_time_changes():
+    assert to_epoch('2025-03-30 04:00:00.000000') - to_epoch('2025-03-30 02:59:00.000000') == 60
+    assert to_epoch('2025-10-26 05:00:00.000000') - to_epoch('2025-10-26 02:00:00.000000') == 4 * 3600
+
+@pytest.mark.parametrize('parser, timedata', [
+    (parse_soda, '29/07/2025 01:00'),
+    (parse_meteo, '29/07/2025'),
+    (parse_meteo, '32/07/2025 01:00'),
+    (parse_wu, '1:05 AM on Juli 29, 2025 EEST'),
+    (parse_open_meteo, 'yesterday'),
+])
+def test_malformed_values_raise(parser, timedata):
+    with pytest.raises(ValueError):
+        parser(timedata)
+
+def test_the_fast_paths_agree_with_strptime():
+    assert parse_meteo('29/07/2025 01:00') == datetime.strptime('29/07/2025 01:00', '%d/%m/%Y %H:%M')
+    assert parse_wu('11:45 PM on December 31, 2025') == datetime.strptime('11:45 PM on December 31, 2025', '%I:%M %p on %B %d, %Y')
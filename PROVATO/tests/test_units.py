@@ -0,0 +1,58 @@
+import pytest
+
+from export.config import load_config
+from preprocessing import preprocessing
+from preprocessing.rows import get_row_type
+from preprocessing.units import get_unit_parser
+
+@pytest.fixture
+def config():
+    return load_config()
+
+def test_rain_in_mm_is_kept(config):
+    # the old cleaning returned 0.0 for every value with a unit
+    assert preprocessing.clean_yetos('2.4 mm', config) == 2.4
+    assert preprocessing.clean_yetos('0.3mm', config) == 0.3
+
+def test_rain_in_inches_is_converted_to_mm(config):
+    assert preprocessing.clean_yetos('0.1 in', config) == 2.5
+    assert preprocessing.clean_yetos('1 inches', config) == 25.4
+
+def test_pressure_is_converted_to_hpa(config):
+    assert preprocessing.clean_barometer('29.92 inHg', config) == round(29.92 * 33.8639, 1)
+    assert preprocessing.clean_barometer('760 mmHg', config) == round(760 * 1.33322, 1)
+    assert preprocessing.clean_barometer('1012 hPa', config) == 1012.0
+
+def test_fahrenheit_is_converted_and_rounded(config):
+    assert preprocessing.clean_temperature('80 °F', config) == 26.7
+    assert preprocessing.clean_dew_point('60°F', config) == 15.6
+
+def test_celsius_is_not_rounded(config):
+    assert preprocessing.clean_temperature('28.85 °C', config) == 28.85
+    assert preprocessing.clean_dew_point('16.25 °C', config) == 16.25
+
+def test_solar_radiation_is_numeric(config):
+    assert preprocessing.clean_solar_radiation('500 W/m²', config) == 500.0
+    assert preprocessing.clean_solar_radiation('12.5 w/m^2', config) == 12.5
+
+@pytest.mark.parametrize('measurement, value', [('temperature', '28 K'), ('wind', '5 knots'), ('barometer', ''), ('humidity', '  ')])
+def test_unknown_units_and_empty_cells_are_not_converted(config, measurement, value):
+    assert get_unit_parser(config).convert(measurement, value) is None
+
+@pytest.mark.parametrize('temperature', ['28 K', ''])
+def test_unknown_units_and_empty_cells_fail_the_row(config, temperature):
+    measurements = {'temperature': temperature, 'humidity': '47%', 'wind': '5 km/h', 'yetos': '0 mm', 'barometer': '1012 hPa'}
+    row = get_row_type(config.columns)([None] * len(config.columns))
+
+    row.temperature = preprocessing.clean_temperature(measurements['temperature'], config)
+    row.humidity = preprocessing.clean_humidity(measurements['humidity'], config)
+    row.wind = preprocessing.clean_wind_speed(measurements['wind'], config)
+    row.direction = preprocessing.clean_wind_direction('NW', row.wind)
+    row.yetos = preprocessing.clean_yetos(measurements['yetos'], config)
+    row.barometer = preprocessing.clean_barometer(measurements['barometer'], config)
+
+    assert preprocessing.check_cleaned_row(row) is False
+
+    row.temperature = preprocessing.clean_temperature('28 °C', config)
+
+    assert preprocessing.check_cleaned_row(row) is True